@@ -2,6 +2,8 @@
 
 # Nathan Rhoades 4/13/2021
 
+import os
+import json
 import platform
 import math
 import bglib
@@ -13,21 +15,126 @@ import signal
 import sys
 import struct
 import importlib
+import functools
+import threading
+
+import crpstream
+
+
+# Connection parameters for gap_connect_direct and connection_update:
+# interval min and max in 1.25 ms units, supervision timeout in 10 ms
+# units and slave latency in connection events. A GATT request and its
+# response take at least one or two connection intervals.
+CONNECTION_PROFILES = {
+    "default": (0x06, 0x10, 0x100, 0),  # 7.5 - 20 ms
+    "fast": (0x06, 0x06, 0x64, 0),  # 7.5 ms, lowest GATT round trip
+    "balanced": (0x10, 0x20, 0x100, 0),  # 20 - 40 ms
+    "relaxed": (0x28, 0x50, 0x190, 0),  # 50 - 100 ms
+}
+
+
+class RoundTrips():
+
+    # GATT request to procedure_completed times in ms, per connection
+    # interval in ms, across connections
+
+    def __init__(self):
+        self.times = {}
+
+    def add(self, interval, ms):
+        self.times.setdefault(interval, []).append(ms)
+
+    def report(self):
+        lines = []
+        for interval, times in sorted(self.times.items(), key=lambda item: item[0] or 0):
+            lines.append("GATT round trip at %s interval: %d requests, mean %.1f ms, max %.1f ms" % (
+                "unknown" if interval is None else "%.2f ms" % interval,
+                len(times), sum(times) / len(times), max(times)))
+        return "\n".join(lines)
+
+
+class HandleCache():
+
+    # GATT handles of the CRP data characteristic and its client
+    # characteristic configuration, per MAC address and firmware version,
+    # so a configuration sync can skip service discovery
+
+    def __init__(self, filename="handles.json"):
+        self.filename = filename
+        self.handles = {}
+        if os.path.isfile(filename):
+            try:
+                with open(filename, "r") as f:
+                    self.handles = json.load(f)
+            except (IOError, OSError, ValueError):
+                self.handles = {}
+
+    def key(self, macaddr, version):
+        # version is None until a version packet of the cue was received
+        return "%s/%s" % (macaddr, version or "")
+
+    def get(self, macaddr, version):
+        # (data handle, CCC handle) or None
+        handles = self.handles.get(self.key(macaddr, version))
+        if handles is None:
+            return None
+        return tuple(handles)
+
+    def put(self, macaddr, version, handle_data, handle_data_ccc):
+        key = self.key(macaddr, version)
+        if self.handles.get(key) == [handle_data, handle_data_ccc]:
+            return
+        self.handles[key] = [handle_data, handle_data_ccc]
+        self.save()
+
+    def discard(self, macaddr, version):
+        if self.handles.pop(self.key(macaddr, version), None) is not None:
+            self.save()
+
+    def save(self):
+        tmp = self.filename + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.handles, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.filename)
 
 
 class Bluegiga():
 
-    def __init__(self, dcb, ser, debugprint=False):
+    def __init__(self, dcb, ser, debugprint=False, handle_cache="handles.json",
+                 profile="default", update_profile=None, framing=None, stream_listeners=()):
 
         self.dcb = dcb
         self.ser = ser
         self.debugprint = debugprint
-
-        while True:
+        # CONNECTION_PROFILES names used to connect, and to renegotiate
+        # right after connecting (None keeps the connect parameters)
+        self.profile = profile
+        self.update_profile = update_profile
+        self.round_trips = RoundTrips()
+        # called with the MAC address and every frame the cue streams on
+        # the CRP data characteristic, cut by framing (a crpstream framing)
+        self.framing = framing if framing is not None else crpstream.RawFraming()
+        self.stream_listeners = list(stream_listeners)
+        # handle_cache=None always runs service discovery
+        self.handle_cache = HandleCache(handle_cache) if handle_cache else None
+        # firmware version per MAC address, from version packets
+        self.versions = {}
+        dcb.packet_listeners.append(self.note_version)
+        # set by stop() from another thread
+        self.stopped = threading.Event()
+
+    def run(self):
+        # serve one connection after another until stop() is called
+        while not self.stopped.is_set():
             importlib.reload(bglib)
             self.initialize()
             self.main_loop()
 
+    def stop(self):
+        # run() returns between two polls of the serial port, never in the
+        # middle of a command or a shot being stored
+        self.stopped.set()
+
     def initialize(self):
 
         self.ble = 0
@@ -45,8 +152,14 @@ class Bluegiga():
         self.connection_count_last = None
         self.mcu_data = None
         self.init_sent = False
-        self.read_data = ""
+        self.streams = {}  # crpstream.StreamBuffer per connection handle
         self.remoteAddressString = ""
+        self.remote_macaddr = None
+        self.cached_handles = False
+        self.connect_time = None
+        self.conn_interval = None
+        self.gatt_sent = None
+        self.gatt_interval = None
         self.my_timeout = None
 
         self.uuid_service = [0x28, 0x00]  # 0x2800
@@ -92,12 +205,69 @@ class Bluegiga():
         self.STATE_FINDING_SERVICES = 2
         self.STATE_FINDING_ATTRIBUTES = 3
         self.STATE_LISTENING_DATA = 4
+        self.STATE_ENABLING_INDICATIONS = 5
         self.state = self.STATE_STANDBY
 
     def dprint(self, prnt):
         if self.debugprint:
             print("%s: %s" % (datetime.datetime.now().time(), prnt))
 
+    def note_version(self, dcb):
+        if dcb.data_type == 0 and dcb.version:
+            self.versions[dcb.macaddr] = dcb.version
+
+    def attclient(self, command):
+        # send a GATT request and time it until procedure_completed, which
+        # may already arrive while check_activity waits for the response
+        self.gatt_sent = time.perf_counter()
+        self.gatt_interval = self.conn_interval
+        self.ble.send_command(self.ser, command)
+        self.ble.check_activity(self.ser, 1)
+
+    def open_stream(self, connection, macaddr):
+        self.streams[connection] = crpstream.StreamBuffer(
+            functools.partial(self.receive_frame, macaddr), self.framing)
+
+    def receive_frame(self, macaddr, frame):
+        for listener in self.stream_listeners:
+            listener(macaddr, frame)
+
+    def update_connection(self):
+        if self.update_profile is None or self.update_profile == self.profile:
+            return
+        self.dprint("Requesting %s connection parameters" % self.update_profile)
+        interval_min, interval_max, timeout, latency = CONNECTION_PROFILES[self.update_profile]
+        self.ble.send_command(self.ser, self.ble.ble_cmd_connection_update(
+            self.connection_handle, interval_min, interval_max, latency, timeout))
+        self.ble.check_activity(self.ser, 1)
+
+    def discover_services(self):
+        # search the whole attribute table for the CRP service
+        self.cached_handles = False
+        self.att_handle_start = 0
+        self.att_handle_end = 0
+        self.att_handle_data = 0
+        self.att_handle_data_ccc = 0
+        self.state = self.STATE_FINDING_SERVICES
+        self.attclient(self.ble.ble_cmd_attclient_read_by_group_type(
+            self.connection_handle, 0x0001, 0xFFFF, list(reversed(self.uuid_service))))
+
+    def enable_indications(self):
+        # enable indications by writing 0x0002 to the client characteristic
+        # configuration attribute
+        self.state = self.STATE_ENABLING_INDICATIONS
+        self.attclient(self.ble.ble_cmd_attclient_attribute_write(
+            self.connection_handle, self.att_handle_data_ccc, [0x02, 0x00]))
+
+    def rediscover(self):
+        # cached handles were rejected, forget them and start over
+        self.dprint("Cached CRP handles failed, running service discovery")
+        self.handle_cache.discard(self.remote_macaddr, self.versions.get(self.remote_macaddr))
+        self.crp_link_ready = False
+        self.pending_write = False
+        self.init_sent = False
+        self.discover_services()
+
     # handler to notify of an API parser timeout condition
     def my_timeout(self, sender, args):
         # might want to try the following lines to reset, though it probably
@@ -107,14 +277,13 @@ class Bluegiga():
         self.dprint(
             "BGAPI parser timed out. Make sure the BLE device is in a known/idle state.")
 
-    # gap_scan_response handler
-    def my_ble_evt_gap_scan_response(self, sender, args):
+    def advertised_services(self, data):
 
         # pull all advertised service info from ad packet
         ad_services = []
         this_field = []
         bytes_left = 0
-        for b in args['data']:
+        for b in data:
             if bytes_left == 0:
                 bytes_left = b
                 this_field = []
@@ -137,6 +306,26 @@ class Bluegiga():
                         for i in range(int((len(this_field) - 1) / 16)):
                             ad_services.append(
                                 this_field[-1 - i * 16: -17 - i * 16: -1])                        
+        return ad_services
+
+    def configuration_data(self):
+        # pending configuration bytes of the decoder followed by their checksum
+        configuration_data = [
+            self.dcb.pendACONF0,
+            self.dcb.pendACONF1,
+            self.dcb.pendACONF2,
+            self.dcb.pendACONF3]
+        chksum = 0
+        for i in configuration_data:
+            chksum += i
+        chksum &= 0xff
+        configuration_data.append(chksum)
+        return configuration_data
+
+    # gap_scan_response handler
+    def my_ble_evt_gap_scan_response(self, sender, args):
+
+        ad_services = self.advertised_services(args['data'])
 
         # check for packets
 
@@ -147,7 +336,7 @@ class Bluegiga():
 
                 # connect to this device
                 self.ble.send_command(self.ser, self.ble.ble_cmd_gap_connect_direct(
-                    args['sender'], args['address_type'], 0x06, 0x10, 0x100, 0))
+                    args['sender'], args['address_type'], *CONNECTION_PROFILES[self.profile]))
                 self.ble.check_activity(self.ser, 1)
                 self.state = self.STATE_CONNECTING
         else:
@@ -156,16 +345,35 @@ class Bluegiga():
     # connection_status handler
     def my_ble_evt_connection_status(self, sender, args):
 
+        if args['flags'] & 0x01 and args['connection'] == self.connection_handle:
+            # sent on connection and after every parameter change
+            self.conn_interval = args['conn_interval'] * 1.25
+            self.dprint("Connection interval %.2f ms, latency %d, timeout %d ms" % (
+                self.conn_interval, args['latency'], args['timeout'] * 10))
+
         if (args['flags'] & 0x05) == 0x05:
             # connected, now perform service discovery
             self.remoteAddressString = ':'.join(
                 ['%02X' % b for b in args['address'][::-1]])
             self.dprint("Connected to %s" % self.remoteAddressString)
             self.connection_handle = args['connection']
-            self.ble.send_command(self.ser, self.ble.ble_cmd_attclient_read_by_group_type(
-                args['connection'], 0x0001, 0xFFFF, list(reversed(self.uuid_service))))
-            self.ble.check_activity(self.ser, 1)
-            self.state = self.STATE_FINDING_SERVICES
+            self.remote_macaddr = self.remoteAddressString.replace(':', '')
+            self.connect_time = time.perf_counter()
+            self.conn_interval = args['conn_interval'] * 1.25
+            self.open_stream(self.connection_handle, self.remote_macaddr)
+            self.update_connection()
+            cached = None
+            if self.handle_cache is not None:
+                cached = self.handle_cache.get(
+                    self.remote_macaddr, self.versions.get(self.remote_macaddr))
+            if cached is not None:
+                # handles known from an earlier sync, skip service discovery
+                self.dprint("Using cached CRP handles: data=%d, ccc=%d" % cached)
+                self.att_handle_data, self.att_handle_data_ccc = cached
+                self.cached_handles = True
+                self.enable_indications()
+            else:
+                self.discover_services()
 
     # attclient_group_found handler
     def my_ble_evt_attclient_group_found(self, sender, args):
@@ -201,6 +409,10 @@ class Bluegiga():
     # attclient_procedure_completed handler
     def my_ble_evt_attclient_procedure_completed(self, sender, args):
 
+        if self.gatt_sent is not None:
+            self.round_trips.add(self.gatt_interval, (time.perf_counter() - self.gatt_sent) * 1000)
+            self.gatt_sent = None
+
         # check if we just finished searching for services
         if self.state == self.STATE_FINDING_SERVICES:
             if self.att_handle_end > 0:
@@ -209,9 +421,8 @@ class Bluegiga():
                 # found the Cable Replacement service, so now search for the
                 # attributes inside
                 self.state = self.STATE_FINDING_ATTRIBUTES
-                self.ble.send_command(self.ser, self.ble.ble_cmd_attclient_find_information(
+                self.attclient(self.ble.ble_cmd_attclient_find_information(
                     self.connection_handle, self.att_handle_start, self.att_handle_end))
-                self.ble.check_activity(self.ser, 1)
             else:
                 self.dprint("Could not find CRP service")
 
@@ -222,38 +433,61 @@ class Bluegiga():
                 self.dprint("Found CRP data attribute")
 
                 # found the data + client characteristic configuration, so enable indications
-                # (this is done by writing 0x0002 to the client characteristic configuration attribute)
-                self.state = self.STATE_LISTENING_DATA
-                self.ble.send_command(self.ser, self.ble.ble_cmd_attclient_attribute_write(
-                    self.connection_handle, self.att_handle_data_ccc, [0x02, 0x00]))
-                self.ble.check_activity(self.ser, 1)
+                self.enable_indications()
+            else:
+                self.dprint("Could not find CRP data attribute")
 
+        # check if indications are enabled
+        elif self.state == self.STATE_ENABLING_INDICATIONS:
+            if args['result'] == 0:
                 # note that the link is ready
+                self.state = self.STATE_LISTENING_DATA
                 self.crp_link_ready = True
+            elif self.cached_handles:
+                self.rediscover()
             else:
-                self.dprint("Could not find CRP data attribute")
+                self.dprint("Could not enable CRP indications")
 
         # check for "write" acknowledgement if we just sent data
         elif self.state == self.STATE_LISTENING_DATA and args['chrhandle'] == self.att_handle_data:
+            if args['result'] != 0 and self.cached_handles:
+                self.rediscover()
+                return
             # clear "write" pending flag so we can send more data
             self.dprint("Configuration change verified by DigiCue Blue")
             self.pending_write = False
+            if args['result'] == 0 and self.handle_cache is not None:
+                self.handle_cache.put(self.remote_macaddr, self.versions.get(self.remote_macaddr),
+                                      self.att_handle_data, self.att_handle_data_ccc)
+            if self.connect_time is not None:
+                self.dprint("Configuration sync took %.0f ms from connection (%s)" % (
+                    (time.perf_counter() - self.connect_time) * 1000,
+                    "cached handles" if self.cached_handles else "service discovery"))
+                self.connect_time = None
+                self.dprint(self.round_trips.report())
 
     # attclient_attribute_value handler
     def my_ble_evt_attclient_attribute_value(self, sender, args):
 
+        if args['type'] == 5:
+            # an indication the cue waits on; confirm it before handling the
+            # value, without waiting for the response, so the next one can
+            # be sent in the next connection event
+            self.ble.send_command(self.ser, self.ble.ble_cmd_attclient_indicate_confirm(args['connection']))
+
         # check for a new value from the connected peripheral's CRP data
         # attribute
-        if args['connection'] == self.connection_handle and args['atthandle'] == self.att_handle_data:
-            #sys.stdout.write(''.join(['%c' % b for b in args['value']]))
-            read_data += ''.join(['%c' % b for b in args['value']])
+        stream = self.streams.get(args['connection'])
+        if stream is not None and args['atthandle'] == self.att_handle_data:
+            stream.feed(args['value'])
 
-    def my_ble_evt_connection_disconnected(self, connection, reason):
+    def my_ble_evt_connection_disconnected(self, sender, args):
 
         self.dprint("Disconnected")
+        self.streams.pop(args['connection'], None)
         self.disconnected = 1
 
-    def main_loop(self):
+    def setup(self):
 
         # create and setup BGLib object
         self.ble = bglib.BGLib()
@@ -299,13 +533,17 @@ class Bluegiga():
                 0xC8, 0xC8, 1))
         self.ble.check_activity(self.ser, 1)
 
+    def main_loop(self):
+
+        self.setup()
+
         # start scanning now
         self.dprint("Scanning for DigiCue Blue")
         self.ble.send_command(self.ser, self.ble.ble_cmd_gap_discover(1))
         self.ble.check_activity(self.ser, 1)
 
         init_byte_sent = False
-        while (self.disconnected == 0):
+        while (self.disconnected == 0 and not self.stopped.is_set()):
 
             # check for all incoming data (no timeout, non-blocking)
             self.ble.check_activity(self.ser)
@@ -318,17 +556,8 @@ class Bluegiga():
                 if not self.init_sent and self.dcb.pendACONF0 is not None:
                     # send configuration data (16 bytes)
                     self.init_sent = True
-                    configuration_data = [
-                        self.dcb.pendACONF0,
-                        self.dcb.pendACONF1,
-                        self.dcb.pendACONF2,
-                        self.dcb.pendACONF3]
-                    chksum = 0
-                    for i in configuration_data:
-                        chksum += i
-                    chksum &= 0xff
-                    configuration_data.append(chksum)
+                    configuration_data = self.configuration_data()
                     self.dprint("Connected")
-                    self.ble.send_command(self.ser, self.ble.ble_cmd_attclient_attribute_write(
-                        self.connection_handle, self.att_handle_data, configuration_data))
                     self.pending_write = True
+                    self.attclient(self.ble.ble_cmd_attclient_attribute_write(
+                        self.connection_handle, self.att_handle_data, configuration_data))
@@ -49,6 +49,52 @@ __email__ = "jeff@rowberg.net"
 import struct
 
 
+class BGAPIFrameDecoder(object):
+
+    """Splits a BGAPI byte stream into complete packets.
+
+    Bytes are collected in one bytearray and every packet is cut off in a
+    single slice, so reads of any size are handled without per-byte work.
+    Garbage that cannot start a BLE packet (e.g. after a dropped byte or a
+    dongle reset) is skipped one byte at a time until a plausible header
+    turns up again.
+    """
+
+    HEADERS = (0x00, 0x80)  # BLE command/response and event
+    MAX_CLASS = 0x09
+    MAX_LENGTH_HIGH = 1  # BLE payloads are well below 512 bytes
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.frames = 0
+        self.skipped = 0
+
+    def feed(self, data, timestamp=None):
+        """Return (timestamp, packet) of every packet completed by data;
+        timestamp is when data was read"""
+        buffer = self.buffer
+        buffer += data
+        frames = []
+        pos = 0
+        end = len(buffer)
+        while end - pos >= 4:
+            b0 = buffer[pos]
+            if (b0 & 0xF8) not in self.HEADERS or (b0 & 0x07) > self.MAX_LENGTH_HIGH \
+                    or buffer[pos + 2] > self.MAX_CLASS:
+                pos += 1
+                self.skipped += 1
+                continue
+            length = 4 + (((b0 & 0x07) << 8) | buffer[pos + 1])
+            if end - pos < length:
+                break
+            frames.append((timestamp, bytes(buffer[pos:pos + length])))
+            pos += length
+        if pos:
+            del buffer[:pos]
+        self.frames += len(frames)
+        return frames
+
+
 # thanks to Masaaki Shibata for Python event handler code
 # http://www.emptypage.jp/notes/pyevent.en.html
 
@@ -640,13 +686,20 @@ class BGLib(object):
             while ser.inWaiting(): self.parse(ser.read())
         return self.busy
 
+    def parse_frame(self, packet):
+        # dispatch one complete packet, e.g. from a BGAPIFrameDecoder; the
+        # last byte completes it in parse() like any byte stream would
+        self.bgapi_rx_buffer = bytes(packet[:-1])
+        self.bgapi_rx_expected_length = len(packet)
+        self.parse(packet[-1:])
+
     def parse(self, barray):
         b=barray[0]
         if len(self.bgapi_rx_buffer) == 0 and (b == 0x00 or b == 0x80 or b == 0x08 or b == 0x88):
             self.bgapi_rx_buffer+=bytes([b])
         elif len(self.bgapi_rx_buffer) == 1:
             self.bgapi_rx_buffer+=bytes([b])
-            self.bgapi_rx_expected_length = 4 + (self.bgapi_rx_buffer[0] & 0x07) + self.bgapi_rx_buffer[1]
+            self.bgapi_rx_expected_length = 4 + ((self.bgapi_rx_buffer[0] & 0x07) << 8) + self.bgapi_rx_buffer[1]
         elif len(self.bgapi_rx_buffer) > 1:
             self.bgapi_rx_buffer+=bytes([b])
 
@@ -17,11 +17,13 @@ except ImportError:
 # Parse arguments
 parser = argparse.ArgumentParser(description='BLE traffic listener for BLED112')
 parser.add_argument('-o', '--output', help='Output file to capture data')
+parser.add_argument('-b', '--binary', help='Binary capture file for replay.py')
 parser.add_argument('-p', '--port', default='/dev/ttyACM0', help='Serial port (default: /dev/ttyACM0)')
 args = parser.parse_args()
 
 PORT = args.port
 capture_file = None
+binary_file = None
 
 try:
     ser = serial.Serial(PORT, 115200, timeout=0.1)
@@ -42,6 +44,15 @@ if args.output:
         print(f"Failed to open capture file: {e}")
         sys.exit(1)
 
+if args.binary:
+    import capture
+    try:
+        binary_file = open(args.binary, 'ab')
+        print(f"Binary capture to: {args.binary}")
+    except Exception as e:
+        print(f"Failed to open binary capture file: {e}")
+        sys.exit(1)
+
 # System reset
 print("Sending system reset...")
 ser.write(bytes.fromhex('00 01 00 00'))
@@ -59,6 +70,8 @@ try:
     while True:
         if ser.in_waiting > 0:
             data = ser.read(ser.in_waiting)
+            if binary_file:
+                capture.write_binary(binary_file, time.time(), data)
             timestamp = datetime.now().strftime("%H:%M:%S.%f")[:-3]
             hex_str = ' '.join(f'{b:02X}' for b in data)
             ascii_str = ''.join(chr(b) if 32 <= b < 127 else '.' for b in data)
@@ -91,4 +104,7 @@ except KeyboardInterrupt:
     if capture_file:
         capture_file.close()
         print(f"Capture saved to: {args.output}")
+    if binary_file:
+        binary_file.close()
+        print(f"Binary capture saved to: {args.binary}")
     print("Closed.")
\ No newline at end of file
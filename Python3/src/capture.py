@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Capture file readers and writers
+
+Two capture formats are understood:
+
+  hex log   - the text format written by ble_listener_rpi.py, one serial
+              read per line: "[HH:MM:SS.mmm] 80 20 06 00 ..." followed by
+              an "ASCII:" line. Lines may hold partial or several frames.
+  binary    - a sequence of records, each an 8 byte little-endian double
+              (unix time in seconds), a 2 byte length and the raw bytes.
+
+Both readers yield (unix time, bytes) tuples.
+"""
+
+import os
+import struct
+import datetime
+
+RECORD = struct.Struct('<dH')
+
+
+def is_hex_log(path):
+    """Hex logs start with a '[HH:MM:SS.mmm]' timestamp"""
+    with open(path, 'rb') as f:
+        return f.read(1) == b'['
+
+
+def read_hex_log(path, date=None):
+    """Read a hex log. The log only stores times of day, so the date is
+    taken from `date` or the file modification time"""
+    if date is None:
+        date = datetime.date.fromtimestamp(os.path.getmtime(path))
+    day = datetime.datetime(date.year, date.month, date.day).timestamp()
+    last = None
+    with open(path, 'r', errors='replace') as f:
+        for line in f:
+            if not line.startswith('['):
+                continue
+            end = line.find(']')
+            try:
+                h, m, s = line[1:end].split(':')
+                t = int(h) * 3600 + int(m) * 60 + float(s)
+            except ValueError:
+                continue
+            # times of day wrap around at midnight
+            if last is not None and t < last - 43200:
+                day += 86400
+            last = t
+            text = line[end + 1:].replace('[APPLE]', '')
+            try:
+                data = bytes.fromhex(text)
+            except ValueError:
+                continue
+            if data:
+                yield day + t, data
+
+
+def read_binary(path, start=0, end=None):
+    """Read binary capture records whose header starts in [start, end)"""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        pos = start
+        while end is None or pos < end:
+            header = f.read(RECORD.size)
+            if len(header) < RECORD.size:
+                break
+            t, length = RECORD.unpack(header)
+            data = f.read(length)
+            if len(data) < length:
+                break
+            pos += RECORD.size + length
+            yield t, data
+
+
+def write_binary(f, t, data):
+    """Append one record to an open binary capture file"""
+    f.write(RECORD.pack(t, len(data)))
+    f.write(data)
+
+
+def read_capture(path, date=None):
+    if is_hex_log(path):
+        return read_hex_log(path, date)
+    return read_binary(path)
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+CRP stream reassembly
+Turns the attribute values a DigiCue Blue notifies or indicates on the
+CRP data characteristic back into the frames it sent. Values are appended
+to one bytearray per connection; a framing object cuts complete frames
+off the front, and every frame is passed to the consumer callback. Bytes
+of an incomplete frame stay buffered until the next value arrives.
+
+Framings:
+
+RawFraming            every attribute value is one frame
+DelimitedFraming      frames end with a delimiter, e.g. b"\\n"
+LengthPrefixFraming   frames start with a 1 or 2 byte little-endian length
+"""
+
+import time
+import struct
+import argparse
+
+
+class RawFraming():
+
+    def split(self, buffer):
+        # (frames, bytes consumed) of the complete frames at the start of buffer
+        if not buffer:
+            return [], 0
+        return [bytes(buffer)], len(buffer)
+
+
+class DelimitedFraming():
+
+    def __init__(self, delimiter=b"\n"):
+        self.delimiter = delimiter
+
+    def split(self, buffer):
+        frames = []
+        start = 0
+        while True:
+            end = buffer.find(self.delimiter, start)
+            if end < 0:
+                return frames, start
+            frames.append(bytes(buffer[start:end]))
+            start = end + len(self.delimiter)
+
+
+class LengthPrefixFraming():
+
+    def __init__(self, size=1):
+        # size of the length field in bytes, 1 or 2
+        self.header = struct.Struct("<B" if size == 1 else "<H")
+
+    def split(self, buffer):
+        frames = []
+        start = 0
+        header = self.header.size
+        while len(buffer) - start >= header:
+            length = self.header.unpack_from(buffer, start)[0]
+            end = start + header + length
+            if end > len(buffer):
+                break
+            frames.append(bytes(buffer[start + header:end]))
+            start = end
+        return frames, start
+
+
+class StreamBuffer():
+
+    # reassembly buffer of one connection
+
+    def __init__(self, consumer, framing=None, max_size=65536):
+        self.consumer = consumer
+        self.framing = framing if framing is not None else RawFraming()
+        self.max_size = max_size
+        self.buffer = bytearray()
+        self.frames = 0
+        self.bytes = 0
+        self.dropped = 0
+
+    def feed(self, data):
+        self.buffer += data
+        self.bytes += len(data)
+        frames, consumed = self.framing.split(self.buffer)
+        if consumed:
+            # one move of the remainder per value, not one per frame
+            del self.buffer[:consumed]
+        if len(self.buffer) > self.max_size:
+            # no frame end in sight, the stream is out of sync
+            self.dropped += len(self.buffer)
+            self.buffer.clear()
+        self.frames += len(frames)
+        for frame in frames:
+            self.consumer(frame)
+
+    def reset(self):
+        self.buffer.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time CRP stream reassembly on synthetic values')
+    parser.add_argument('-n', '--frames', type=int, default=100000, help='frames to send (default: 100000)')
+    parser.add_argument('-s', '--size', type=int, default=48, help='frame payload in bytes (default: 48)')
+    parser.add_argument('-m', '--mtu', type=int, default=20, help='bytes per attribute value (default: 20)')
+    parser.add_argument('--framing', default='length', choices=('length', 'line'),
+                        help='framing (default: length)')
+    args = parser.parse_args()
+
+    payload = bytes(range(1, args.size + 1))
+    if args.framing == 'line':
+        framing = DelimitedFraming(b"\n")
+        frame = payload.replace(b"\n", b" ") + b"\n"
+    else:
+        framing = LengthPrefixFraming(2)
+        frame = struct.pack("<H", len(payload)) + payload
+    stream = frame * args.frames
+    values = [stream[i:i + args.mtu] for i in range(0, len(stream), args.mtu)]
+
+    received = []
+    buffer = StreamBuffer(received.append, framing)
+    t0 = time.perf_counter()
+    for value in values:
+        buffer.feed(value)
+    t1 = time.perf_counter()
+    print("%d values, %d frames, %.1f MB/s, %.2f us per value" % (
+        len(values), len(received), len(stream) / (t1 - t0) / 1e6, (t1 - t0) / len(values) * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,235 +1,228 @@
 #!/usr/bin/env python3
 """
 DigiCue Listening Daemon
-Continuously listens for DigiCue devices and broadcasts scan requests every 5 seconds
-"""
+Continuously listens for DigiCue devices and restarts the scan every 5 seconds
 
-import sys
-sys.path.insert(0, '/Users/sarkhan/Library/Python/3.13/lib/python/site-packages')
+Runs on one asyncio loop: serial bytes are cut into BGAPI packets by
+bglib.BGAPIFrameDecoder, stamped with the time they were read, and
+dispatched through BGLib.parse_frame. Commands are built with BGLib.
+"""
 
 import serial
 import struct
 import time
-import threading
-import signal
+import asyncio
+import argparse
 from datetime import datetime
 
+import bglib
+import digicueblue
+
+
 class DigiCueDaemon:
-    def __init__(self, port='/dev/cu.usbmodem11'):
+    def __init__(self, port='/dev/cu.usbmodem11', rescan=5.0):
         self.port = port
+        self.rescan = rescan
         self.ser = None
         self.running = False
         self.connected_devices = {}
-        self.last_broadcast = 0
         self.scan_active = False
-        
+        self.frame_time = None  # time.time() the current frame was read
+
+        self.decoder = bglib.BGAPIFrameDecoder()
+        self.ble = bglib.BGLib()
+        self.ble.ble_evt_gap_scan_response += self.handle_scan_response
+        self.ble.ble_evt_connection_status += self.handle_connection_status
+        self.ble.ble_evt_attclient_attribute_value += self.handle_notification
+
+        # decoder.frames and time of the last status line
+        self.frames_reported = 0
+        self.frames_since = time.time()
+
     def connect(self):
         """Connect to BLED112"""
         try:
-            self.ser = serial.Serial(self.port, 115200, timeout=0.1)
+            self.ser = serial.Serial(self.port, 115200, timeout=0)
             print(f"[{self.timestamp()}] Connected to BLED112 on {self.port}")
             return True
         except Exception as e:
             print(f"[{self.timestamp()}] Failed to connect: {e}")
             return False
-    
-    def timestamp(self):
-        """Get current timestamp"""
-        return datetime.now().strftime("%H:%M:%S")
-    
+
+    def timestamp(self, t=None):
+        """Get current timestamp, or the time of t"""
+        return datetime.fromtimestamp(t if t is not None else time.time()).strftime("%H:%M:%S")
+
+    def send(self, packet):
+        # never blocks on a response, replies arrive through the decoder
+        self.ser.write(packet)
+
     def reset_module(self):
-        """Reset BLE module"""
-        print(f"[{self.timestamp()}] Resetting BLE module...")
-        self.ser.write(b'\x00\x00\x01\x00\x00\x00')
-        time.sleep(1)
-        self.ser.flushInput()
-    
+        """Bring the BLE module to a known idle state"""
+        print(f"[{self.timestamp()}] Resetting BLE module state...")
+        self.send(self.ble.ble_cmd_connection_disconnect(0))
+        self.send(self.ble.ble_cmd_gap_set_mode(0, 0))
+        self.send(self.ble.ble_cmd_gap_end_procedure())
+        # active scanning, so scan requests are sent
+        self.send(self.ble.ble_cmd_gap_set_scan_parameters(0xC8, 0xC8, 1))
+
     def start_scan(self):
         """Start BLE scanning"""
         if not self.scan_active:
             print(f"[{self.timestamp()}] Starting BLE scan...")
-            # Set GAP mode
-            self.ser.write(b'\x00\x00\x02\x06\x01\x00\x00')
-            time.sleep(0.1)
-            # Start discovery
-            self.ser.write(b'\x00\x00\x01\x06\x02\x02')
+            self.send(self.ble.ble_cmd_gap_discover(2))  # observation, every advertiser
             self.scan_active = True
-            self.last_broadcast = time.time()
-    
+
     def stop_scan(self):
         """Stop BLE scanning"""
         if self.scan_active:
-            self.ser.write(b'\x00\x00\x00\x06\x04')
+            self.send(self.ble.ble_cmd_gap_end_procedure())
             self.scan_active = False
-    
-    def parse_packet(self):
-        """Parse incoming BGAPI packets"""
-        if self.ser.in_waiting < 4:
-            return
-        
-        # Read header
-        header = self.ser.read(4)
-        if len(header) < 4:
-            return
-            
-        msg_type, tech_type, payload_len, cls_id = struct.unpack('<BBBB', header)
-        
-        # Read command ID and payload
-        if self.ser.in_waiting >= payload_len + 1:
-            cmd_id = struct.unpack('<B', self.ser.read(1))[0]
-            payload = self.ser.read(payload_len) if payload_len > 0 else b''
-            
-            # Handle scan response
-            if msg_type == 0x80 and cls_id == 0x06 and cmd_id == 0x00:
-                self.handle_scan_response(payload)
-            # Handle connection status
-            elif msg_type == 0x80 and cls_id == 0x03 and cmd_id == 0x00:
-                self.handle_connection_status(payload)
-            # Handle notifications
-            elif msg_type == 0x80 and cls_id == 0x04 and cmd_id == 0x05:
-                self.handle_notification(payload)
-    
-    def handle_scan_response(self, payload):
+
+    def receive(self, data):
+        """Decode and dispatch the packets completed by data"""
+        for t, packet in self.decoder.feed(data, time.time()):
+            self.frame_time = t
+            self.ble.parse_frame(packet)
+
+    def handle_scan_response(self, sender, args):
         """Handle scan response packets"""
-        if len(payload) < 11:
-            return
-        
-        rssi = struct.unpack('<b', payload[0:1])[0]
-        address = payload[2:8]
+        rssi = args['rssi']
+        address = args['sender']
         addr_hex = ':'.join(f'{b:02X}' for b in address[::-1])
-        
-        data_len = payload[10] if len(payload) > 10 else 0
-        data = payload[11:11+data_len] if len(payload) > 11 and data_len > 0 else b''
-        
+        data = args['data']
+
         # Check if DigiCue
-        if 'B7:76:8E' in addr_hex or b'DigiCue' in data:
+        if 'B7:76:8E' in addr_hex or b'DigiCue' in data or digicueblue.is_digicue(data):
             if addr_hex not in self.connected_devices:
-                print(f"\n[{self.timestamp()}] 🎯 DigiCue found!")
+                print(f"\n[{self.timestamp(self.frame_time)}] 🎯 DigiCue found!")
                 print(f"  Address: {addr_hex}")
                 print(f"  RSSI: {rssi} dBm")
-                if data:
-                    try:
-                        ascii_data = data.decode('ascii', errors='replace')
-                        print(f"  Name: {ascii_data}")
-                    except:
-                        pass
+                if b'DigiCue' in data:
+                    print(f"  Name: {data.decode('ascii', errors='replace')}")
                 self.connected_devices[addr_hex] = {
                     'rssi': rssi,
-                    'last_seen': time.time(),
+                    'last_seen': self.frame_time,
                     'address': address
                 }
             else:
                 # Update RSSI and last seen
                 self.connected_devices[addr_hex]['rssi'] = rssi
-                self.connected_devices[addr_hex]['last_seen'] = time.time()
-    
-    def handle_connection_status(self, payload):
+                self.connected_devices[addr_hex]['last_seen'] = self.frame_time
+
+    def handle_connection_status(self, sender, args):
         """Handle connection status events"""
-        if len(payload) >= 16:
-            connection, flags, address = struct.unpack('<BB6s', payload[:8])
-            addr_hex = ':'.join(f'{b:02X}' for b in address[::-1])
-            
-            if flags & 0x01:
-                print(f"\n[{self.timestamp()}] ✓ Connected to {addr_hex}")
-            else:
-                print(f"\n[{self.timestamp()}] ✗ Disconnected from {addr_hex}")
-    
-    def handle_notification(self, payload):
+        addr_hex = ':'.join(f'{b:02X}' for b in args['address'][::-1])
+        if args['flags'] & 0x01:
+            print(f"\n[{self.timestamp(self.frame_time)}] ✓ Connected to {addr_hex}")
+        else:
+            print(f"\n[{self.timestamp(self.frame_time)}] ✗ Disconnected from {addr_hex}")
+
+    def handle_notification(self, sender, args):
         """Handle data notifications from DigiCue"""
-        if len(payload) >= 5:
-            connection, atthandle = struct.unpack('<BH', payload[:3])
-            value_len = payload[3]
-            value = payload[4:4+value_len] if len(payload) >= 4+value_len else b''
-            
-            print(f"\n[{self.timestamp()}] 📊 DigiCue Data:")
-            print(f"  Handle: {atthandle}")
-            print(f"  Raw: {' '.join(f'{b:02X}' for b in value)}")
-            
-            # Try to interpret the data (adjust based on actual protocol)
-            if len(value) >= 2:
-                val = struct.unpack('<H', value[:2])[0]
-                print(f"  Value: {val}")
-    
-    def broadcast_loop(self):
-        """Broadcast scan requests every 5 seconds"""
+        value = args['value']
+        print(f"\n[{self.timestamp(self.frame_time)}] 📊 DigiCue Data:")
+        print(f"  Handle: {args['atthandle']}")
+        print(f"  Raw: {' '.join(f'{b:02X}' for b in value)}")
+
+        # Try to interpret the data (adjust based on actual protocol)
+        if len(value) >= 2:
+            val = struct.unpack('<H', value[:2])[0]
+            print(f"  Value: {val}")
+
+    def status(self):
+        now = time.time()
+        frames = self.decoder.frames - self.frames_reported
+        rate = frames / (now - self.frames_since) if now > self.frames_since else 0.0
+        skipped = f", {self.decoder.skipped} bytes skipped" if self.decoder.skipped else ""
+        if self.connected_devices:
+            print(f"\n[{self.timestamp()}] 📡 Rescanning... ({len(self.connected_devices)} DigiCue(s) tracked, {rate:.0f} frames/s{skipped})")
+            for addr, info in self.connected_devices.items():
+                age = int(now - info['last_seen'])
+                print(f"  {addr}: RSSI {info['rssi']} dBm (last seen {age}s ago)")
+        else:
+            print(f"\n[{self.timestamp()}] 📡 Rescanning... (no devices found yet, {rate:.0f} frames/s{skipped})")
+        self.frames_reported = self.decoder.frames
+        self.frames_since = now
+
+    async def rescan_loop(self):
+        """Restart the scan every rescan seconds"""
         while self.running:
-            current_time = time.time()
-            
-            # Broadcast every 5 seconds
-            if current_time - self.last_broadcast >= 5:
-                self.stop_scan()
-                time.sleep(0.1)
-                self.start_scan()
-                
-                # Show status
-                if self.connected_devices:
-                    print(f"\n[{self.timestamp()}] 📡 Broadcasting... ({len(self.connected_devices)} DigiCue(s) tracked)")
-                    for addr, info in self.connected_devices.items():
-                        age = int(current_time - info['last_seen'])
-                        print(f"  {addr}: RSSI {info['rssi']} dBm (last seen {age}s ago)")
+            await asyncio.sleep(self.rescan)
+            self.stop_scan()
+            await asyncio.sleep(0.1)
+            self.start_scan()
+            self.status()
+
+    async def read_loop(self):
+        """Feed serial bytes to the decoder as soon as they arrive"""
+        loop = asyncio.get_running_loop()
+        try:
+            # POSIX: the loop wakes up when the port is readable
+            fileno = self.ser.fileno()
+            readable = asyncio.Event()
+            loop.add_reader(fileno, readable.set)
+        except (AttributeError, NotImplementedError, ValueError):
+            fileno = None
+            # Windows: reads in a worker thread return at least every 0.1 s
+            self.ser.timeout = 0.1
+        try:
+            while self.running:
+                if fileno is not None:
+                    await readable.wait()
+                    readable.clear()
+                    data = self.ser.read(self.ser.in_waiting or 1)
                 else:
-                    print(f"\n[{self.timestamp()}] 📡 Broadcasting... (no devices found yet)")
-            
-            time.sleep(0.1)
-    
-    def listen_loop(self):
-        """Main listening loop"""
-        while self.running:
-            try:
-                self.parse_packet()
-            except Exception as e:
-                if self.running:
-                    print(f"\n[{self.timestamp()}] Error: {e}")
-            time.sleep(0.001)
-    
+                    data = await loop.run_in_executor(None, self.read_blocking)
+                if data:
+                    self.receive(data)
+        finally:
+            if fileno is not None:
+                loop.remove_reader(fileno)
+
+    def read_blocking(self):
+        return self.ser.read(self.ser.in_waiting or 1)
+
+    async def main(self):
+        self.running = True
+        self.reset_module()
+        await asyncio.sleep(0.1)
+
+        # Start initial scan
+        self.start_scan()
+        try:
+            await asyncio.gather(self.read_loop(), self.rescan_loop())
+        finally:
+            self.running = False
+
     def run(self):
         """Run the daemon"""
         if not self.connect():
             return
-        
+
         print(f"\n{'='*60}")
         print("DigiCue Listening Daemon Started")
         print(f"{'='*60}")
-        print("Broadcasting every 5 seconds...")
+        print(f"Rescanning every {self.rescan:g} seconds...")
         print("Press Ctrl+C to stop\n")
-        
-        self.running = True
-        
+
         try:
-            # Reset module
-            self.reset_module()
-            
-            # Start initial scan
-            self.start_scan()
-            
-            # Start threads
-            broadcast_thread = threading.Thread(target=self.broadcast_loop)
-            broadcast_thread.daemon = True
-            broadcast_thread.start()
-            
-            listen_thread = threading.Thread(target=self.listen_loop)
-            listen_thread.daemon = True
-            listen_thread.start()
-            
-            # Wait for Ctrl+C
-            while self.running:
-                time.sleep(0.1)
-                
+            asyncio.run(self.main())
         except KeyboardInterrupt:
             print(f"\n[{self.timestamp()}] Shutting down...")
         finally:
             self.running = False
-            self.stop_scan()
-            time.sleep(0.5)
             if self.ser and self.ser.is_open:
+                self.stop_scan()
+                time.sleep(0.5)
                 self.ser.close()
             print(f"[{self.timestamp()}] Daemon stopped")
 
-def signal_handler(sig, frame):
-    """Handle Ctrl+C gracefully"""
-    pass
 
 if __name__ == "__main__":
-    signal.signal(signal.SIGINT, signal_handler)
-    daemon = DigiCueDaemon()
-    daemon.run()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Listen for DigiCue devices')
+    parser.add_argument('-p', '--port', default='/dev/cu.usbmodem11', help='BLED112 serial port')
+    parser.add_argument('-r', '--rescan', type=float, default=5.0, help='seconds between scan restarts (default: 5)')
+    args = parser.parse_args()
+    daemon = DigiCueDaemon(args.port, args.rescan)
+    daemon.run()
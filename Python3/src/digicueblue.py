@@ -5,11 +5,21 @@ import struct
 import datetime
 import math
 import os
+import shutil
+import history
 
 
 def toHex(x): return " ".join([hex(ord(c))[2:].zfill(2) for c in x])
 
 
+def is_digicue(data):
+    # Filter for minimum 14 bytes length and Nathan Rhoades LLC
+    # manufacturing header
+    if len(data) < 14:
+        return False
+    return (data[0:3] == b"\x02\x01\x06") and (int(data[10]) >= 4) and (data[11:14] == b"\xFF\x03\xDE")
+
+
 class DigicueBlue():
 
     ACONF0 = None
@@ -100,18 +110,29 @@ class DigicueBlue():
     threshold_power = None
     threshold_freeze = None
 
-    file_date = []
-    file_shotpause = []
-    file_bspause = []
-    file_jab = []
-    file_followthru = []
-    file_steering = []
-    file_steering_direction = []
-    file_straightness = []
-    file_power = []
-    file_freeze = []
-    file_impactx = []
-    file_impacty = []
+    # Threshold for each ACONF1/ACONF2 threshold setting (0-3) of each metric
+    threshold_levels = {
+        "shotpause": (5.0, 8.0, 12.0, 15.0),
+        "bspause": (0.1, 0.2, 0.5, 1.0),
+        "jab": ((125 - 25) / 12.5, (125 - 50) / 12.5, (125 - 75) / 12.5, (125 - 100) / 12.5),
+        "followthru": (4.0, 6.0, 8.0, 10.0),
+        "steering": (2.0, 4.0, 6.0, 8.0),
+        "straightness": (9.0, 8.0, 6.0, 3.0),
+        "power": (7.0, 5.0, 3.0, 2.0),
+        "freeze": (1.0, 1.5, 2.0, 2.5),
+    }
+
+    # Metric of each scored config_options entry, in ALERT0 bit order
+    config_metrics = (
+        ("Shot Interval", "shotpause"),
+        ("Backstroke Pause", "bspause"),
+        ("Jab", "jab"),
+        ("Follow Through", "followthru"),
+        ("Tip Steer", "steering"),
+        ("Straightness", "straightness"),
+        ("Finesse", "power"),
+        ("Finish", "freeze"),
+    )
 
     config_options = [
         ("Shot Interval", (("5s", 0), ("8s", 1), ("12s", 2), ("15s", 3))),
@@ -212,13 +233,28 @@ class DigicueBlue():
     def __init__(self, filename=None, debugprint=False):
         self.filename = filename
         self.debugprint = debugprint
+        self.timestamp = None
+        # called with this instance after every decoded shot
+        self.shot_listeners = []
+        # called with this instance after every new version or shot packet
+        self.packet_listeners = []
+        # called with this instance and the MAC address of every DigiCue
+        # Blue the first time it is seen
+        self.device_listeners = []
+        self.devices_seen = set()
+        # shots loaded by file_import
+        self.history = history.ShotHistory()
+        self.header_checked = False
 
     def dprint(self, prnt):
         if self.debugprint:
             print("%s (%i): %s" % (datetime.datetime.now().time(), self.packet_count, prnt))
 
-    def file_import(self, datefrom=None, dateto=None, macaddr=None):
+    def file_import(self, datefrom=None, dateto=None, macaddr=None, shots=None):
 
+        # shots is the ShotHistory to fill, self.history by default
+        if shots is None:
+            shots = self.history
         file = open(self.filename, "r")
         linenum = 0
 
@@ -228,8 +264,19 @@ class DigicueBlue():
                 break
             linenum += 1
             parse = line.rstrip().split(',')
-            date = datetime.datetime.strptime(parse[0], "%Y-%m-%d %H:%M:%S.%f")
-            macaddr = parse[1]
+            if parse[0] == "Date":  # header
+                continue
+            try:
+                date = datetime.datetime.fromisoformat(parse[0])
+                scores = [float(x) for x in parse[2:7]] + [float(x) for x in parse[8:13]]
+                direction = parse[7]
+                # configuration and alerts are only stored by newer versions
+                if len(parse) > 17:
+                    config = (int(parse[14]), int(parse[15]), int(parse[17]))
+                else:
+                    config = (None, None, None)
+            except (ValueError, IndexError):
+                continue  # row being written, or damaged
 
             append = True
 
@@ -238,36 +285,22 @@ class DigicueBlue():
                     break
 
             if datefrom is not None:
-                if date >= datefrom:
+                if date < datefrom:
+                    append = False
+
+            if macaddr is not None:
+                if parse[1] != macaddr:
                     append = False
 
             if append:
-                self.file_date.append(date)
-                self.file_shotpause.append(float(parse[2]))
-                self.file_bspause.append(float(parse[3]))
-                self.file_jab.append(float(parse[4]))
-                self.file_followthru.append(float(parse[5]))
-                self.file_steering.append(float(parse[6]))
-                self.file_steering_direction.append(parse[7])
-                self.file_straightness.append(float(parse[8]))
-                self.file_power.append(float(parse[9]))
-                self.file_freeze.append(float(parse[10]))
-                self.file_impactx.append(float(parse[11]))
-                self.file_impacty.append(float(parse[11]))
+                shots.append(date, scores, direction, config)
 
         file.close()
 
-    def file_append(self):
-        if self.filename is None:
-            return
-
-        exists = os.path.isfile(self.filename)
-        file = open(self.filename, "a")
-        if not exists:
-            tmp = "Date,MAC,ShotInterval,BackstrokePause,Jab,FollowThrough,TipSteer,TipSteerDir,Straightness,Finesse,Finish,ImpactX,ImpactY\n"
-            file.write(tmp)
+    csv_header = "Date,MAC,ShotInterval,BackstrokePause,Jab,FollowThrough,TipSteer,TipSteerDir,Straightness,Finesse,Finish,ImpactX,ImpactY,ACONF0,ACONF1,ACONF2,ACONF3,ALERT0,ALERT1\n"
 
-        textstr = "%s" % (str(datetime.datetime.now()))
+    def csv_row(self):
+        textstr = "%s" % (str(self.timestamp))
         textstr += ",%s" % self.macaddr
         textstr += ",%.2f" % self.score_shotpause
         textstr += ",%.2f" % self.score_bspause
@@ -280,13 +313,42 @@ class DigicueBlue():
         textstr += ",%.2f" % self.score_freeze
         textstr += ",%.2f" % self.impactx
         textstr += ",%.2f" % self.impacty
+        textstr += ",%i,%i,%i,%i" % (self.ACONF0, self.ACONF1, self.ACONF2, self.ACONF3)
+        textstr += ",%i,%i" % (self.ALERT0, self.ALERT1)
         textstr += "\n"
+        return textstr
+
+    def file_append(self):
+        if self.filename is None:
+            return
+
+        exists = os.path.isfile(self.filename)
+        if exists and not self.header_checked:
+            self.migrate_header()
+        self.header_checked = True
+        file = open(self.filename, "a")
+        if not exists:
+            file.write(self.csv_header)
 
-        file.write(textstr)
+        file.write(self.csv_row())
 
         if file is not None:
             file.close()
 
+    def migrate_header(self):
+        # files written before ACONF0-3 and ALERT0-1 were stored have a
+        # shorter header; give them the current one, older rows stay as
+        # they are and read back without those columns
+        with open(self.filename, "r") as file:
+            header = file.readline()
+            if header == self.csv_header or not header.startswith("Date,"):
+                return
+            tmp = self.filename + ".tmp"
+            with open(tmp, "w") as out:
+                out.write(self.csv_header)
+                shutil.copyfileobj(file, out)
+        os.replace(tmp, self.filename)
+
     def debug_print(self):
         if not self.debugprint:
             return
@@ -349,19 +411,18 @@ class DigicueBlue():
         macaddr = mac[::-1]        
         return (6 * "%.2X") % tuple(macaddr)
 
-    def receive(self, mac, data):        
+    def receive(self, mac, data, timestamp=None):
 
-        # Filter for minimum 14 bytes length
-        if len(data) < 14:
+        # Filter for DigiCue Blue advertisements
+        if not is_digicue(data):
             return
-     
-       
-        # Filter for Nathan Rhoades LLC manufacturing header        
-        if (data[0:3] != b"\x02\x01\x06") or (int(data[10])<4) or (data[11:14] != b"\xFF\x03\xDE"):
-            return       
 
         # Set mac address
         self.macaddr = self.format_mac_addr(mac)
+        if self.macaddr not in self.devices_seen:
+            self.devices_seen.add(self.macaddr)
+            for listener in self.device_listeners:
+                listener(self, self.macaddr)
         if self.macaddr_filter != self.macaddr:
             return
 
@@ -380,6 +441,7 @@ class DigicueBlue():
         if mcu_data[0] == self.packet_count:
             return
         self.packet_count = mcu_data[0]
+        self.timestamp = timestamp if timestamp is not None else datetime.datetime.now()
         self.data = data
         self.data_type = data_type
         self.config = config
@@ -471,40 +533,16 @@ class DigicueBlue():
             self.bspause = backstroke_pause
             self.score_bspause = backstroke_pause
 
-            tmp = int(self.threshset_bspause)
-            if tmp == 0:
-                self.threshold_bspause = 0.1
-            elif tmp == 1:
-                self.threshold_bspause = 0.2
-            elif tmp == 2:
-                self.threshold_bspause = 0.5
-            else:
-                self.threshold_bspause = 1.0
+            self.threshold_bspause = self.threshold_levels["bspause"][self.threshset_bspause]
 
             tmp = jabmag
             if tmp > 125:
                 tmp = 125
             self.score_jab = (125 - tmp) / 12.5
-            tmp = self.threshset_jab
-            if tmp == 0:
-                self.threshold_jab = (125 - 25) / 12.5
-            elif tmp == 1:
-                self.threshold_jab = (125 - 50) / 12.5
-            elif tmp == 2:
-                self.threshold_jab = (125 - 75) / 12.5
-            else:
-                self.threshold_jab = (125 - 100) / 12.5
+            self.threshold_jab = self.threshold_levels["jab"][self.threshset_jab]
 
             self.score_followthru = follow_thr - 1
-            tmp = int(self.threshset_followthru)
-            if tmp == 0:
-                self.threshold_followthru = 4.0
-            elif tmp == 1:
-                self.threshold_followthru = 6.0
-            elif tmp == 2:
-                self.threshold_followthru = 8.0
-            else:
-                self.threshold_followthru = 10.0
+            self.threshold_followthru = self.threshold_levels["followthru"][self.threshset_followthru]
 
             j = 0
             for k in range(0, 10):
@@ -517,15 +555,7 @@ class DigicueBlue():
             if impactmag <= 10:
                 j = 10
             self.score_steering = j
-            tmp = int(self.threshset_steering)
-            if tmp == 0:
-                self.threshold_steering = 2.0
-            elif tmp == 1:
-                self.threshold_steering = 4.0
-            elif tmp == 2:
-                self.threshold_steering = 6.0
-            else:
-                self.threshold_steering = 8.0
+            self.threshold_steering = self.threshold_levels["steering"][self.threshset_steering]
 
             self.score_steering_direction = "C"
             if self.impactmag > 10:
@@ -539,15 +569,7 @@ class DigicueBlue():
                 tmp = 50
             tmp = (50 - tmp) / 5.0
             self.score_straightness = tmp
-            tmp = int(self.threshset_straightness)
-            if tmp == 0:
-                self.threshold_straightness = 9.0
-            elif tmp == 1:
-                self.threshold_straightness = 8.0
-            elif tmp == 2:
-                self.threshold_straightness = 6.0
-            else:
-                self.threshold_straightness = 3.0
+            self.threshold_straightness = self.threshold_levels["straightness"][self.threshset_straightness]
 
             tmp = shotpower
             if tmp < 50:
@@ -555,37 +577,13 @@ class DigicueBlue():
             if tmp > 110:
                 tmp = 110
             self.score_power = 10 - (10 * (tmp - 50.0) / (110 - 50.0))
-            tmp = int(self.threshset_power)
-            if tmp == 0:
-                self.threshold_power = 7.0
-            elif tmp == 1:
-                self.threshold_power = 5.0
-            elif tmp == 2:
-                self.threshold_power = 3.0
-            else:
-                self.threshold_power = 2.0
+            self.threshold_power = self.threshold_levels["power"][self.threshset_power]
 
             self.score_freeze = (freezetime + 48) * 0.012
-            tmp = int(self.threshset_freeze)
-            if tmp == 0:
-                self.threshold_freeze = 1.0
-            elif tmp == 1:
-                self.threshold_freeze = 1.5
-            elif tmp == 2:
-                self.threshold_freeze = 2.0
-            else:
-                self.threshold_freeze = 2.5
+            self.threshold_freeze = self.threshold_levels["freeze"][self.threshset_freeze]
 
             self.score_shotpause = self.shottime
-            tmp = int(self.threshset_shotpause)
-            if tmp == 0:
-                self.threshold_shotpause = 5.0
-            elif tmp == 1:
-                self.threshold_shotpause = 8.0
-            elif tmp == 2:
-                self.threshold_shotpause = 12.0
-            else:
-                self.threshold_shotpause = 15.0
+            self.threshold_shotpause = self.threshold_levels["shotpause"][self.threshset_shotpause]
 
             self.alert_shotpause = (alert0 >> 0) & 1
             self.alert_bspause = (alert0 >> 1) & 1
@@ -604,4 +602,102 @@ class DigicueBlue():
 
             self.file_append()
 
+            for listener in self.shot_listeners:
+                listener(self)
+
+        for listener in self.packet_listeners:
+            listener(self)
+
         self.debug_print()
+
+
+class StoredShot():
+
+    # A shot read back from data.csv, with the same attribute names as a
+    # DigicueBlue after receive() so shot listeners can consume both
+
+    def __init__(self, parse):
+        self.timestamp = datetime.datetime.fromisoformat(parse[0])
+        self.macaddr = parse[1]
+        self.score_shotpause = float(parse[2])
+        self.score_bspause = float(parse[3])
+        self.score_jab = float(parse[4])
+        self.score_followthru = float(parse[5])
+        self.score_steering = float(parse[6])
+        self.score_steering_direction = parse[7]
+        self.score_straightness = float(parse[8])
+        self.score_power = float(parse[9])
+        self.score_freeze = float(parse[10])
+        self.impactx = float(parse[11])
+        self.impacty = float(parse[12])
+        if len(parse) > 18:
+            self.ACONF0, self.ACONF1, self.ACONF2, self.ACONF3 = [int(x) for x in parse[13:17]]
+            self.ALERT0 = int(parse[17])
+            self.ALERT1 = int(parse[18])
+        else:
+            self.ACONF0 = self.ACONF1 = self.ACONF2 = self.ACONF3 = None
+            self.ALERT0 = self.ALERT1 = None
+
+
+class Snapshot():
+
+    # Copy of the decoded state of a DigicueBlue taken in the BGAPI thread,
+    # so another thread can read one packet without racing the next
+
+    fields = (
+        ["macaddr", "packet_count", "data_type", "timestamp", "version",
+         "ACONF0", "ACONF1", "ACONF2", "ACONF3", "ALERT0", "ALERT1",
+         "setting_vop", "setting_dvibe", "impactx", "impacty",
+         "score_steering_direction"] +
+        ["setting_" + metric for label, metric in DigicueBlue.config_metrics] +
+        ["threshset_" + metric for label, metric in DigicueBlue.config_metrics] +
+        ["threshold_" + metric for label, metric in DigicueBlue.config_metrics] +
+        ["score_" + metric for label, metric in DigicueBlue.config_metrics])
+
+    def __init__(self, dcb):
+        for name in self.fields:
+            setattr(self, name, getattr(dcb, name))
+
+
+def read_shots(filename):
+    with open(filename, "r") as file:
+        for line in file:
+            parse = line.rstrip().split(',')
+            if parse[0] == "Date":  # header
+                continue
+            try:
+                shot = StoredShot(parse)
+            except (ValueError, IndexError):
+                continue  # row being written, or damaged
+            yield shot
+
+
+class DigicueBlueGroup():
+
+    # Decodes every DigiCue Blue in range with one DigicueBlue per MAC
+    # address, so packet counters and configurations of different cues
+    # never mix. Accepts the same receive() call as DigicueBlue.
+
+    pendACONF0 = None  # cues are never configured through a group
+
+    def __init__(self, filename=None, debugprint=False):
+        self.filename = filename
+        self.debugprint = debugprint
+        self.devices = {}
+        self.shot_listeners = []
+        self.packet_listeners = []
+        self.device_listeners = []
+
+    def receive(self, mac, data, timestamp=None):
+        if not is_digicue(data):
+            return
+        key = bytes(mac)
+        dcb = self.devices.get(key)
+        if dcb is None:
+            dcb = DigicueBlue(filename=self.filename, debugprint=self.debugprint)
+            dcb.macaddr_filter = dcb.format_mac_addr(mac)
+            dcb.shot_listeners = self.shot_listeners
+            dcb.packet_listeners = self.packet_listeners
+            dcb.device_listeners = self.device_listeners
+            self.devices[key] = dcb
+        dcb.receive(mac, data, timestamp)
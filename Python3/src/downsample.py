@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Time series downsampling for charts
+Picks at most a few points per pixel from a stored metric column so a
+chart over 100k+ shots draws a line of a few hundred points. Every method
+works on any row range of the columns, so zoom and pan only touch the
+visible shots:
+
+lttb     Largest-Triangle-Three-Buckets, keeps the visual shape
+minmax   lowest and highest point of every bucket, keeps every extreme
+chart    min/max down to a few points per pixel, then LTTB
+
+All return row numbers in time order; xs and ys are sequences such as the
+memoryviews from history.ShotHistory.column().
+"""
+
+import time
+import bisect
+import argparse
+
+import digicueblue
+
+
+def lttb(xs, ys, start, end, threshold):
+    """Rows of at most threshold points of rows start..end-1"""
+    n = end - start
+    if threshold >= n or threshold < 3:
+        return list(range(start, end))
+    every = (n - 2) / float(threshold - 2)
+    rows = [start]
+    a = start
+    for i in range(threshold - 2):
+        # this bucket is rows b0..b1-1, the next one b1..b2-1
+        b0 = start + 1 + int(i * every)
+        b1 = start + 1 + int((i + 1) * every)
+        b2 = min(start + 1 + int((i + 2) * every), end - 1)
+        if b2 > b1:
+            cx = sum(xs[b1:b2]) / float(b2 - b1)
+            cy = sum(ys[b1:b2]) / float(b2 - b1)
+        else:
+            cx = xs[end - 1]
+            cy = ys[end - 1]
+        ax = xs[a]
+        ay = ys[a]
+        # twice the area of the triangle (a, j, c) is linear in point j
+        dx = cx - ax
+        dy = cy - ay
+        a = max(range(b0, b1), key=lambda j: abs(dx * (ys[j] - ay) - dy * (xs[j] - ax)))
+        rows.append(a)
+    rows.append(end - 1)
+    return rows
+
+
+def minmax(xs, ys, start, end, buckets):
+    """Rows of the lowest and highest point of each of buckets buckets"""
+    n = end - start
+    if 2 * buckets >= n:
+        return list(range(start, end))
+    rows = []
+    for i in range(buckets):
+        b0 = start + i * n // buckets
+        b1 = start + (i + 1) * n // buckets
+        bucket = list(ys[b0:b1])
+        low = b0 + bucket.index(min(bucket))
+        high = b0 + bucket.index(max(bucket))
+        if low < high:
+            rows.append(low)
+            rows.append(high)
+        elif low > high:
+            rows.append(high)
+            rows.append(low)
+        else:
+            rows.append(low)
+    return rows
+
+
+def chart(xs, ys, start, end, points):
+    """Rows to draw for a chart of points points: LTTB, preceded by a
+    min/max pass when there are many more shots than points"""
+    if end - start > 8 * points:
+        rows = minmax(xs, ys, start, end, 2 * points)
+        picked = lttb([xs[row] for row in rows], [ys[row] for row in rows], 0, len(rows), points)
+        return [rows[i] for i in picked]
+    return lttb(xs, ys, start, end, points)
+
+
+def visible(xs, first, last):
+    """Row range start, end of the sorted xs with first <= x <= last"""
+    return bisect.bisect_left(xs, first), bisect.bisect_right(xs, last)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time a downsampled chart query over stored shots')
+    parser.add_argument('-f', '--file', default='data.csv', help='shot store (default: data.csv)')
+    parser.add_argument('-t', '--metric', default='jab', help='metric column (default: jab)')
+    parser.add_argument('-n', '--points', type=int, default=800, help='points to keep (default: 800)')
+    parser.add_argument('--method', default='chart', choices=('chart', 'lttb', 'minmax'),
+                        help='downsampling method (default: chart)')
+    args = parser.parse_args()
+
+    dcb = digicueblue.DigicueBlue(filename=args.file)
+    dcb.file_import()
+    dates = dcb.history.column("date")
+    values = dcb.history.column(args.metric)
+    t0 = time.perf_counter()
+    start, end = visible(dates, dates[0], dates[-1]) if len(dates) else (0, 0)
+    if args.method == 'minmax':
+        rows = minmax(dates, values, start, end, args.points // 2)
+    elif args.method == 'lttb':
+        rows = lttb(dates, values, start, end, args.points)
+    else:
+        rows = chart(dates, values, start, end, args.points)
+    t1 = time.perf_counter()
+    print("%d shots -> %d points in %.1f ms" % (end - start, len(rows), (t1 - t0) * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Split radio engine and GUI processes
+"main.py --split" keeps the serial port, BGAPI parser, decoder and shot
+persistence in the main process, and runs the Tk GUI in a child process.
+Canvas work never competes with serial draining for the GIL, and a
+crashed GUI is restarted without losing packets.
+
+The engine streams ("filter", macaddr), ("device", macaddr) and
+("packet", Snapshot) messages to the GUI over a multiprocessing.Queue of
+at most EVENTS messages; while the GUI is not reading, the oldest are
+dropped.
+The GUI sends ("filter", macaddr) and ("config", configuration) commands
+back. The last BACKLOG packets are kept and replayed to a restarted GUI,
+so its bars and plot come back with recent shots. When the window is
+closed, on_close (bgapi.Bluegiga.stop) ends the engine.
+"""
+
+import time
+import queue
+import threading
+import multiprocessing
+from collections import deque
+
+import digicueblue
+
+BACKLOG = 500  # packets replayed to a restarted GUI
+EVENTS = 2 * BACKLOG  # messages queued for the GUI
+
+
+class Engine():
+
+    # runs in the main process, next to bgapi.Bluegiga
+
+    def __init__(self, dcb, on_close=None, backlog=BACKLOG, restart_delay=1.0):
+        self.dcb = dcb
+        self.on_close = on_close
+        self.restart_delay = restart_delay
+        self.lock = threading.Lock()
+        self.devices = []
+        self.backlog = deque(maxlen=backlog)
+        self.events = None
+        self.commands = None
+        self.process = None
+        self.dropped = 0
+        dcb.device_listeners.append(self.push_device)
+        dcb.packet_listeners.append(self.push_packet)
+
+    def start(self):
+        thread = threading.Thread(target=self.supervise, daemon=True)
+        thread.start()
+
+    def push_device(self, dcb, macaddr):
+        # called in the BGAPI thread
+        with self.lock:
+            self.devices.append(macaddr)
+            if self.events is not None:
+                self.send(self.events, ("device", macaddr))
+
+    def push_packet(self, dcb):
+        item = ("packet", digicueblue.Snapshot(dcb))
+        with self.lock:
+            self.backlog.append(item)
+            if self.events is not None:
+                self.send(self.events, item)
+
+    def send(self, events, item):
+        # never blocks the BGAPI thread: when the queue is full, the oldest
+        # message makes room
+        try:
+            events.put_nowait(item)
+            return
+        except queue.Full:
+            pass
+        try:
+            events.get_nowait()
+        except queue.Empty:
+            pass  # still in the feeder thread
+        try:
+            events.put_nowait(item)
+        except queue.Full:
+            pass
+        self.dropped += 1
+
+    def start_gui(self):
+        # a GUI that died may have left its queues locked, so every GUI
+        # gets new ones
+        events = multiprocessing.Queue(EVENTS)
+        commands = multiprocessing.Queue()
+        with self.lock:
+            self.send(events, ("filter", self.dcb.macaddr_filter))
+            for macaddr in self.devices:
+                self.send(events, ("device", macaddr))
+            for item in self.backlog:
+                self.send(events, item)
+            self.events = events
+        self.commands = commands
+        self.process = multiprocessing.Process(
+            target=gui_main, args=(events, commands), name="DigiCue GUI")
+        self.process.start()
+        threading.Thread(target=self.serve, args=(commands,), daemon=True).start()
+
+    def serve(self, commands):
+        # apply GUI commands until that GUI goes away
+        while True:
+            try:
+                kind, value = commands.get(timeout=1.0)
+            except queue.Empty:
+                if self.commands is not commands:
+                    return
+                continue
+            if kind == "filter":
+                self.dcb.macaddr_filter = value
+            elif kind == "config":
+                self.dcb.set_config(value)
+
+    def supervise(self):
+        while True:
+            self.start_gui()
+            self.process.join()
+            with self.lock:
+                # nobody reads what is still queued, do not wait for it to
+                # be flushed at exit
+                self.events.cancel_join_thread()
+                self.events = None
+            self.commands = None
+            if self.process.exitcode == 0:
+                # window closed
+                if self.on_close is not None:
+                    self.on_close()
+                return
+            print("GUI exited with code %s, restarting (%d messages dropped)" % (
+                self.process.exitcode, self.dropped))
+            time.sleep(self.restart_delay)
+
+
+class RemoteDigicueBlue(digicueblue.DigicueBlue):
+
+    # Stands in for the DigicueBlue of the engine inside the GUI process.
+    # Attributes mirror the last received packet; listeners run in the
+    # receiving thread just as they run in the BGAPI thread otherwise.
+
+    def __init__(self, events, commands, filename="data.csv"):
+        # filename is only read, by the History tab
+        digicueblue.DigicueBlue.__init__(self, filename=filename)
+        self.events = events
+        self.commands = commands
+        self._macaddr_filter = None
+
+    @property
+    def macaddr_filter(self):
+        return self._macaddr_filter
+
+    @macaddr_filter.setter
+    def macaddr_filter(self, macaddr):
+        self._macaddr_filter = macaddr
+        self.commands.put(("filter", macaddr))
+
+    def set_config(self, configuration):
+        digicueblue.DigicueBlue.set_config(self, configuration)
+        self.commands.put(("config", dict(configuration)))
+
+    def start(self):
+        thread = threading.Thread(target=self.receive_events, daemon=True)
+        thread.start()
+
+    def receive_events(self):
+        while True:
+            kind, item = self.events.get()
+            if kind == "filter":
+                # device selected by an earlier GUI
+                self._macaddr_filter = item
+                continue
+            if kind == "device":
+                if item not in self.devices_seen:
+                    self.devices_seen.add(item)
+                    for listener in self.device_listeners:
+                        listener(self, item)
+                continue
+            for name in item.fields:
+                setattr(self, name, getattr(item, name))
+            if item.data_type == 1:
+                for listener in self.shot_listeners:
+                    listener(self)
+            for listener in self.packet_listeners:
+                listener(self)
+
+
+def gui_main(events, commands):
+    # entry point of the GUI process
+    import tkinter as Tk
+    import gui
+    import stats
+    import ringbuffer
+
+    dcb = RemoteDigicueBlue(events, commands)
+    shot_stats = stats.ShotStats()
+    rolling = ringbuffer.RollingShots()
+    dcb.shot_listeners.append(shot_stats.add_shot)
+    dcb.shot_listeners.append(rolling.add_shot)
+    root = Tk.Tk()
+    gui.GUI(root, dcb, shot_stats, rolling)
+    dcb.start()
+    root.mainloop()
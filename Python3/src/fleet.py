@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+"""
+Fleet configuration
+Pushes one configuration to many DigiCue Blues at once, e.g. the cues of
+a class. Every cue put in configuration mode (power button pressed twice)
+is connected as soon as it is seen, up to the number of connection slots
+of the BLED112, and each connection runs its own discovery, CCC and
+configuration write. A cue counts as configured when it acknowledges the
+write of its configuration bytes and checksum.
+
+    python fleet.py -n 20 -s Jab=High -s "Tip Steer=Medium"
+
+Settings not given are Off.
+"""
+
+import time
+import argparse
+import importlib
+
+import serial
+import bglib
+import bgapi
+import digicueblue
+
+SLOTS = 3  # connections of the stock BLED112 firmware
+
+# states of a FleetConnection
+CONNECTING = 0
+FINDING_SERVICES = 1
+FINDING_ATTRIBUTES = 2
+ENABLING_INDICATIONS = 3
+WRITING = 4
+VERIFIED = 5
+FAILED = 6
+
+
+class FleetConnection():
+
+    # one cue being configured
+
+    def __init__(self, macaddr, address, address_type):
+        self.macaddr = macaddr
+        self.address = address
+        self.address_type = address_type
+        self.handle = None
+        self.state = CONNECTING
+        self.att_handle_start = 0
+        self.att_handle_end = 0
+        self.att_handle_data = 0
+        self.att_handle_data_ccc = 0
+        self.cached_handles = False
+        self.requested = time.perf_counter()
+        self.connected = None
+        self.verified = None
+        self.interval = None  # ms
+        self.gatt_sent = None
+        self.gatt_interval = None
+
+
+class FleetConfig(bgapi.Bluegiga):
+
+    # Unlike Bluegiga, which serves a single connection forever, run()
+    # returns once count cues are configured or nothing happened for
+    # idle seconds.
+
+    def __init__(self, dcb, ser, count=None, slots=SLOTS, idle=60.0,
+                 connection_timeout=10.0, retries=2, debugprint=False,
+                 handle_cache="handles.json", profile="default", update_profile=None,
+                 framing=None, stream_listeners=()):
+        bgapi.Bluegiga.__init__(self, dcb, ser, debugprint=debugprint, handle_cache=handle_cache,
+                                profile=profile, update_profile=update_profile,
+                                framing=framing, stream_listeners=stream_listeners)
+        # dcb only holds the configuration to write and decodes nothing, as
+        # it listens to no MAC address; every cue gets its own decoder so
+        # its version packets reach note_version
+        self.group = digicueblue.DigicueBlueGroup()
+        self.group.packet_listeners.append(self.note_version)
+        self.count = count
+        self.slots = slots
+        self.idle = idle
+        self.connection_timeout = connection_timeout
+        self.retries = retries
+
+    def initialize(self):
+        bgapi.Bluegiga.initialize(self)
+        self.connections = {}  # by connection handle
+        self.connecting = None  # FleetConnection of the pending connect
+        self.results = {}  # by MAC address, FleetConnection of the last attempt
+        self.attempts = {}
+        self.scanning = False
+        self.start_time = None
+        self.last_activity = None
+
+    def configured(self):
+        return [c for c in self.results.values() if c.state == VERIFIED]
+
+    def done(self):
+        return self.count is not None and len(self.configured()) >= self.count
+
+    def active(self):
+        return len(self.connections) + (self.connecting is not None)
+
+    def start_scan(self):
+        if not self.scanning and not self.done() and self.active() < self.slots:
+            self.ble.send_command(self.ser, self.ble.ble_cmd_gap_discover(1))
+            self.ble.check_activity(self.ser, 1)
+            self.scanning = True
+
+    def stop_scan(self):
+        self.ble.send_command(self.ser, self.ble.ble_cmd_gap_end_procedure())
+        self.ble.check_activity(self.ser, 1)
+        self.scanning = False
+
+    def finish(self, conn, state):
+        conn.state = state
+        if state == VERIFIED:
+            conn.verified = time.perf_counter()
+            self.dprint("%s configured in %.0f ms from connection (%s)" % (
+                conn.macaddr, (conn.verified - conn.connected) * 1000,
+                "cached handles" if conn.cached_handles else "service discovery"))
+            if self.handle_cache is not None:
+                self.handle_cache.put(conn.macaddr, self.versions.get(conn.macaddr),
+                                      conn.att_handle_data, conn.att_handle_data_ccc)
+        self.last_activity = time.perf_counter()
+        if conn.handle is not None:
+            self.ble.send_command(
+                self.ser, self.ble.ble_cmd_connection_disconnect(conn.handle))
+
+    # per connection steps, as in Bluegiga
+
+    def request(self, conn, command):
+        conn.gatt_sent = time.perf_counter()
+        conn.gatt_interval = conn.interval
+        self.ble.send_command(self.ser, command)
+
+    def discover_services(self, conn):
+        conn.cached_handles = False
+        conn.att_handle_start = 0
+        conn.att_handle_end = 0
+        conn.att_handle_data = 0
+        conn.att_handle_data_ccc = 0
+        conn.state = FINDING_SERVICES
+        self.request(conn, self.ble.ble_cmd_attclient_read_by_group_type(
+            conn.handle, 0x0001, 0xFFFF, list(reversed(self.uuid_service))))
+
+    def enable_indications(self, conn):
+        conn.state = ENABLING_INDICATIONS
+        self.request(conn, self.ble.ble_cmd_attclient_attribute_write(
+            conn.handle, conn.att_handle_data_ccc, [0x02, 0x00]))
+
+    def write_configuration(self, conn):
+        conn.state = WRITING
+        self.request(conn, self.ble.ble_cmd_attclient_attribute_write(
+            conn.handle, conn.att_handle_data, self.configuration_data()))
+
+    def rediscover(self, conn):
+        self.dprint("%s: cached CRP handles failed, running service discovery" % conn.macaddr)
+        if self.handle_cache is not None:
+            self.handle_cache.discard(conn.macaddr, self.versions.get(conn.macaddr))
+        self.discover_services(conn)
+
+    # BGAPI event handlers
+
+    def my_ble_evt_gap_scan_response(self, sender, args):
+        if self.uuid_crp_service not in self.advertised_services(args['data']):
+            # version packets, for the handle cache key
+            self.group.receive(args['sender'], args['data'])
+            return
+        macaddr = self.dcb.format_mac_addr(args['sender'])
+        if macaddr in self.results or self.connecting is not None:
+            return
+        if self.done() or self.active() >= self.slots:
+            return
+        if self.attempts.get(macaddr, 0) > self.retries:
+            return
+        self.attempts[macaddr] = self.attempts.get(macaddr, 0) + 1
+        # only one connect may be pending, and it ends scanning
+        self.scanning = False
+        conn = FleetConnection(macaddr, args['sender'], args['address_type'])
+        self.connecting = conn
+        self.results[macaddr] = conn
+        self.dprint("Connecting to %s" % macaddr)
+        self.ble.send_command(self.ser, self.ble.ble_cmd_gap_connect_direct(
+            args['sender'], args['address_type'], *bgapi.CONNECTION_PROFILES[self.profile]))
+
+    def my_ble_evt_connection_status(self, sender, args):
+        if (args['flags'] & 0x05) != 0x05:
+            conn = self.connections.get(args['connection'])
+            if conn is not None and args['flags'] & 0x01:
+                # parameters changed
+                conn.interval = args['conn_interval'] * 1.25
+                self.dprint("%s: connection interval %.2f ms" % (conn.macaddr, conn.interval))
+            return
+        conn = self.connecting
+        if conn is None or bytes(args['address']) != bytes(conn.address):
+            return
+        self.connecting = None
+        conn.handle = args['connection']
+        conn.connected = time.perf_counter()
+        conn.interval = args['conn_interval'] * 1.25
+        self.connections[conn.handle] = conn
+        self.open_stream(conn.handle, conn.macaddr)
+        self.last_activity = conn.connected
+        self.dprint("Connected to %s on connection %d, interval %.2f ms" % (
+            conn.macaddr, conn.handle, conn.interval))
+        if self.update_profile is not None and self.update_profile != self.profile:
+            interval_min, interval_max, timeout, latency = bgapi.CONNECTION_PROFILES[self.update_profile]
+            self.ble.send_command(self.ser, self.ble.ble_cmd_connection_update(
+                conn.handle, interval_min, interval_max, latency, timeout))
+        cached = None
+        if self.handle_cache is not None:
+            cached = self.handle_cache.get(conn.macaddr, self.versions.get(conn.macaddr))
+        if cached is not None:
+            conn.att_handle_data, conn.att_handle_data_ccc = cached
+            conn.cached_handles = True
+            self.enable_indications(conn)
+        else:
+            self.discover_services(conn)
+        self.start_scan()
+
+    def my_ble_evt_attclient_group_found(self, sender, args):
+        conn = self.connections.get(args['connection'])
+        if conn is not None and args['uuid'] == bytearray(self.uuid_crp_service)[::-1]:
+            conn.att_handle_start = args['start']
+            conn.att_handle_end = args['end']
+
+    def my_ble_evt_attclient_find_information_found(self, sender, args):
+        conn = self.connections.get(args['connection'])
+        if conn is None:
+            return
+        if args['uuid'] == bytearray(self.uuid_crp_characteristic)[::-1]:
+            conn.att_handle_data = args['chrhandle']
+        elif args['uuid'] == bytearray(self.uuid_client_characteristic_configuration)[::-1] \
+                and conn.att_handle_data > 0:
+            conn.att_handle_data_ccc = args['chrhandle']
+
+    def my_ble_evt_attclient_procedure_completed(self, sender, args):
+        conn = self.connections.get(args['connection'])
+        if conn is None:
+            return
+        self.last_activity = time.perf_counter()
+        if conn.gatt_sent is not None:
+            self.round_trips.add(conn.gatt_interval, (self.last_activity - conn.gatt_sent) * 1000)
+            conn.gatt_sent = None
+        if conn.state == FINDING_SERVICES:
+            if conn.att_handle_end > 0:
+                conn.state = FINDING_ATTRIBUTES
+                self.request(conn, self.ble.ble_cmd_attclient_find_information(
+                    conn.handle, conn.att_handle_start, conn.att_handle_end))
+            else:
+                self.dprint("%s: could not find CRP service" % conn.macaddr)
+                self.finish(conn, FAILED)
+        elif conn.state == FINDING_ATTRIBUTES:
+            if conn.att_handle_data_ccc > 0:
+                self.enable_indications(conn)
+            else:
+                self.dprint("%s: could not find CRP data attribute" % conn.macaddr)
+                self.finish(conn, FAILED)
+        elif conn.state == ENABLING_INDICATIONS:
+            if args['result'] == 0:
+                self.write_configuration(conn)
+            elif conn.cached_handles:
+                self.rediscover(conn)
+            else:
+                self.finish(conn, FAILED)
+        elif conn.state == WRITING and args['chrhandle'] == conn.att_handle_data:
+            if args['result'] == 0:
+                self.finish(conn, VERIFIED)
+            elif conn.cached_handles:
+                self.rediscover(conn)
+            else:
+                self.dprint("%s: configuration write failed (0x%04X)" % (conn.macaddr, args['result']))
+                self.finish(conn, FAILED)
+
+    def my_ble_evt_attclient_attribute_value(self, sender, args):
+        if args['type'] == 5:
+            self.ble.send_command(self.ser, self.ble.ble_cmd_attclient_indicate_confirm(args['connection']))
+        conn = self.connections.get(args['connection'])
+        if conn is not None and args['atthandle'] == conn.att_handle_data:
+            self.streams[conn.handle].feed(args['value'])
+
+    def my_ble_evt_connection_disconnected(self, sender, args):
+        conn = self.connections.pop(args['connection'], None)
+        self.streams.pop(args['connection'], None)
+        if conn is None:
+            return
+        if conn.state not in (VERIFIED, FAILED):
+            self.dprint("%s disconnected before it was configured" % conn.macaddr)
+            conn.state = FAILED
+        if conn.state == FAILED:
+            # try again if it still advertises
+            del self.results[conn.macaddr]
+        self.last_activity = time.perf_counter()
+        self.start_scan()
+
+    def check_timeouts(self):
+        now = time.perf_counter()
+        conn = self.connecting
+        if conn is not None and now - conn.requested > self.connection_timeout:
+            self.dprint("Connecting to %s timed out" % conn.macaddr)
+            self.connecting = None
+            conn.state = FAILED
+            del self.results[conn.macaddr]
+            self.stop_scan()  # cancels the connect
+            self.start_scan()
+        for conn in list(self.connections.values()):
+            if conn.state not in (VERIFIED, FAILED) and now - conn.connected > self.connection_timeout:
+                self.dprint("%s timed out" % conn.macaddr)
+                self.finish(conn, FAILED)
+
+    def run(self):
+        importlib.reload(bglib)
+        self.initialize()
+        self.setup()
+        # free every connection slot left over from an earlier run
+        for handle in range(1, self.slots):
+            self.ble.send_command(self.ser, self.ble.ble_cmd_connection_disconnect(handle))
+            self.ble.check_activity(self.ser, 1)
+        self.start_time = self.last_activity = time.perf_counter()
+        self.start_scan()
+        while not (self.done() and not self.connections):
+            self.ble.check_activity(self.ser)
+            self.check_timeouts()
+            if time.perf_counter() - self.last_activity > self.idle:
+                break
+            time.sleep(0.001)
+        if self.scanning:
+            self.stop_scan()
+        return self.configured()
+
+    def report(self):
+        configured = sorted(self.configured(), key=lambda c: c.verified)
+        if not configured:
+            return "No cues configured"
+        lines = []
+        for conn in configured:
+            lines.append("%s  %6.0f ms from connection, %6.1f s after start%s" % (
+                conn.macaddr, (conn.verified - conn.connected) * 1000,
+                conn.verified - self.start_time, "  (cached handles)" if conn.cached_handles else ""))
+        times = [conn.verified - conn.connected for conn in configured]
+        lines.append("Configured %d cues in %.1f s (connection to verified: mean %.0f ms, max %.0f ms)" % (
+            len(configured), configured[-1].verified - self.start_time,
+            1000 * sum(times) / len(times), 1000 * max(times)))
+        lines.append(self.round_trips.report())
+        return "\n".join(lines)
+
+
+def configuration(settings):
+    # ["Jab=High", ...] as mode strings for DigicueBlue.set_config
+    config = dict((label, "-1") for label, modes in digicueblue.DigicueBlue.config_options)
+    for item in settings:
+        label, value = [text.strip() for text in item.split('=', 1)]
+        modes = dict(digicueblue.DigicueBlue.config_options).get(label)
+        if modes is None:
+            raise ValueError("Unknown setting %r" % label)
+        if value == "Off":
+            # as the Off buttons of the Configure tab
+            config[label] = "-1"
+            continue
+        for text, mode in modes:
+            if value == text or value == str(mode):
+                config[label] = str(mode)
+                break
+        else:
+            raise ValueError("Unknown value %r for %s" % (value, label))
+    return config
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Configure many DigiCue Blues at once')
+    parser.add_argument('-p', '--port', help='BLED112 serial port (default: read from comport.cfg)')
+    parser.add_argument('-n', '--count', type=int, help='stop after this many cues (default: when idle)')
+    parser.add_argument('-s', '--set', action='append', default=[],
+                        help='setting, e.g. -s Jab=High -s "Tip Steer=Medium"; settings not given are Off')
+    parser.add_argument('--slots', type=int, default=SLOTS,
+                        help='parallel connections (default: %d)' % SLOTS)
+    parser.add_argument('--profile', default='default', choices=sorted(bgapi.CONNECTION_PROFILES),
+                        help='connection parameters to connect with (default: default)')
+    parser.add_argument('--update', choices=sorted(bgapi.CONNECTION_PROFILES),
+                        help='connection parameters to request right after connecting')
+    parser.add_argument('--idle', type=float, default=60.0,
+                        help='stop after this many seconds without a cue (default: 60)')
+    args = parser.parse_args()
+
+    comport = args.port
+    if comport is None:
+        with open("comport.cfg", "r") as f:
+            comport = f.readline().strip()
+
+    dcb = digicueblue.DigicueBlue(debugprint=False)
+    dcb.set_config(configuration(args.set))
+    ser = serial.Serial(comport, 115200, timeout=1, writeTimeout=1)
+    fleet = FleetConfig(dcb, ser, count=args.count, slots=args.slots, idle=args.idle, debugprint=True,
+                        profile=args.profile, update_profile=args.update)
+    print("Press the power button twice on every cue to configure")
+    try:
+        fleet.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ser.close()
+    print(fleet.report())
+
+
+if __name__ == '__main__':
+    main()
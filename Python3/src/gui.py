@@ -3,49 +3,76 @@
 VERSION = "1.0.0"
 
 import sys
+import time
+import queue
+import threading
 import random
 import helptext
+import history
+import downsample
+import digicueblue
+import ringbuffer
 import tkinter as Tk
 from tkinter import ttk
 
 class Resizable():
     def __init__(self, canvas):
         self.canvas = canvas
-        self.canvas_width_orig = canvas.width
-        self.canvas_height_orig = canvas.height
+        # last coordinates and options sent to the canvas, so unchanged
+        # items are not touched again
+        self.drawn = None
+        self.options = {}
 
     def redraw(self, x0, y0, x1, y1, **kwargs):
-        self.ratio_width = self.canvas.width / float(self.canvas_width_orig)
-        self.ratio_height = self.canvas.height / float(self.canvas_height_orig)
-        a = x0 * self.ratio_width
-        b = y0 * self.ratio_height
-        c = x1 * self.ratio_width
-        d = y1 * self.ratio_height
+        ratio_width = self.canvas.ratio_width
+        ratio_height = self.canvas.ratio_height
+        drawn = (x0, y0, x1, y1, ratio_width, ratio_height)
+        if drawn == self.drawn and not kwargs:
+            return
+        self.drawn = drawn
+        a = x0 * ratio_width
+        b = y0 * ratio_height
+        c = x1 * ratio_width
+        d = y1 * ratio_height
         self.canvas.coords(self.object, a, b, c, d, **kwargs)
 
     def itemconfig(self, **kwargs):
-        self.canvas.itemconfig(self.object, **kwargs)
+        changed = {}
+        for key, value in kwargs.items():
+            if self.options.get(key) != value:
+                changed[key] = value
+        if changed:
+            self.options.update(changed)
+            self.canvas.itemconfig(self.object, **changed)
 
 
 class ResizablePlotPoint(Resizable):
     def __init__(self, canvas, x0, y0, mag, **kwargs):
+        # x0, y0 are unscaled canvas coordinates
         Resizable.__init__(self, canvas)
         self.x0 = x0
         self.y0 = y0
         self.mag = mag
         self.size = 3
+        a = x0 * canvas.ratio_width
+        b = y0 * canvas.ratio_height
         self.object = canvas.create_oval(
-            x0 - self.size,
-            y0 - self.size,
-            x0 + self.size,
-            y0 + self.size,
+            a - self.size,
+            b - self.size,
+            a + self.size,
+            b + self.size,
             **kwargs)
+        self.options.update(kwargs)
 
     def redraw(self, **kwargs):
-        self.ratio_width = self.canvas.width / float(self.canvas_width_orig)
-        self.ratio_height = self.canvas.height / float(self.canvas_height_orig)
-        a = self.x0 * self.ratio_width
-        b = self.y0 * self.ratio_height
+        ratio_width = self.canvas.ratio_width
+        ratio_height = self.canvas.ratio_height
+        drawn = (self.x0, self.y0, ratio_width, ratio_height)
+        if drawn == self.drawn and not kwargs:
+            return
+        self.drawn = drawn
+        a = self.x0 * ratio_width
+        b = self.y0 * ratio_height
         self.canvas.coords(
             self.object,
             a - self.size,
@@ -59,30 +86,38 @@ class ResizableRectangle(Resizable):
     def __init__(self, canvas, x0, y0, x1, y1, **kwargs):
         Resizable.__init__(self, canvas)
         self.object = canvas.create_rectangle(x0, y0, x1, y1, **kwargs)
+        self.options.update(kwargs)
 
 
 class ResizableLine(Resizable):
     def __init__(self, canvas, x0, y0, x1, y1, **kwargs):
         Resizable.__init__(self, canvas)
         self.object = canvas.create_line(x0, y0, x1, y1, **kwargs)
+        self.options.update(kwargs)
 
 
 class ResizableOval(Resizable):
     def __init__(self, canvas, x0, y0, x1, y1, **kwargs):
         Resizable.__init__(self, canvas)
         self.object = canvas.create_oval(x0, y0, x1, y1, **kwargs)
+        self.options.update(kwargs)
 
 
 class ResizableText(Resizable):
     def __init__(self, canvas, x0, y0, **kwargs):
         Resizable.__init__(self, canvas)
         self.object = canvas.create_text(x0, y0, **kwargs)
+        self.options.update(kwargs)
 
     def redraw(self, x0, y0, **kwargs):
-        self.ratio_width = self.canvas.width / float(self.canvas_width_orig)
-        self.ratio_height = self.canvas.height / float(self.canvas_height_orig)
-        a = x0 * self.ratio_width
-        b = y0 * self.ratio_height
+        ratio_width = self.canvas.ratio_width
+        ratio_height = self.canvas.ratio_height
+        drawn = (x0, y0, ratio_width, ratio_height)
+        if drawn == self.drawn and not kwargs:
+            return
+        self.drawn = drawn
+        a = x0 * ratio_width
+        b = y0 * ratio_height
         self.canvas.coords(self.object, a, b, **kwargs)
 
 
@@ -92,17 +127,41 @@ class ResizableCanvas(Tk.Canvas):
         self.bind("<Configure>", self.on_resize)
         self.height = self.winfo_reqheight()
         self.width = self.winfo_reqwidth()
+        # every Resizable is positioned in coordinates of the original size
+        self.width_orig = self.width
+        self.height_orig = self.height
+        self.ratio_width = 1.0
+        self.ratio_height = 1.0
+        # called after every applied resize
+        self.resize_listeners = []
+        self.resize_delay = 50  # ms
+        self.pending_resize = None
 
     def on_resize(self, event):
+        # Configure events arrive in bursts while the window is dragged;
+        # only apply the last one
+        if self.pending_resize is not None:
+            self.after_cancel(self.pending_resize)
+        self.pending_resize = self.after(
+            self.resize_delay, self.resize, event.width, event.height)
+
+    def resize(self, width, height):
+        self.pending_resize = None
+        if width == self.width and height == self.height:
+            return
         # determine the ratio of old width/height to new width/height
-        wscale = float(event.width) / self.width
-        hscale = float(event.height) / self.height
-        self.width = event.width
-        self.height = event.height
+        wscale = float(width) / self.width
+        hscale = float(height) / self.height
+        self.width = width
+        self.height = height
+        self.ratio_width = self.width / float(self.width_orig)
+        self.ratio_height = self.height / float(self.height_orig)
         # resize the canvas
         self.config(width=self.width, height=self.height)
         # rescale all the objects tagged with the "all" tag
         self.scale("all", 0, 0, wscale, hscale)
+        for listener in self.resize_listeners:
+            listener()
 
 
 class ScoreBar:
@@ -118,22 +177,47 @@ class ScoreBar:
         self.threshold = 0.0
         self.average = 0.0
         self.points = 0.0
+        self.enabled = True
+        self.stats = None  # stats.RunningStats of this metric, if available
 
         self.scorebar = ResizableRectangle(
             canvas, 0, 0, 0, 0, fill="red", outline="")
         self.avgbar = ResizableRectangle(
             canvas, 0, 0, 0, 0, fill="dark gray", outline="")
+        self.bandbar = ResizableRectangle(
+            canvas, 0, 0, 0, 0, outline="black")
         self.thresholdline = ResizableLine(canvas, 0, 0, 0, 0)
 
         ResizableRectangle(canvas, left, top, right, bottom)
 
+    def clip(self, value):
+        if value < 0:
+            return 0
+        elif value > self.scale:
+            return self.scale
+        return value
+
     def update(self, enabled=True):
-        self.points += 1
-        if self.points == 1:
-            self.average = self.score
-        else:
-            self.average = self.average * \
-                (self.points - 1) / float(self.points) + self.score / float(self.points)
+        self.add()
+        self.draw(enabled)
+
+    def add(self):
+        # account for a new score in the average
+        if self.stats is None:
+            self.points += 1
+            if self.points == 1:
+                self.average = self.score
+            else:
+                self.average = self.average * \
+                    (self.points - 1) / float(self.points) + self.score / float(self.points)
+
+    def draw(self, enabled=None):
+        if enabled is None:
+            enabled = self.enabled
+        if self.stats is not None:
+            # average comes from the streaming statistics
+            self.points = self.stats.count
+            self.average = self.stats.mean
 
         score = self.score
         threshold = self.threshold
@@ -170,20 +254,107 @@ class ScoreBar:
         self.scorebar.redraw(self.left, self.top, mid, self.bottom)
         self.avgbar.redraw(self.left, self.bottom, avg,
                             self.bottom + (self.bottom - self.top) * 0.25)
+        if self.stats is not None and self.stats.count > 0:
+            # interquartile band of all shots so far
+            low, high = self.stats.band()
+            low = self.left + (self.right - self.left) * self.clip(low) / self.scale
+            high = self.left + (self.right - self.left) * self.clip(high) / self.scale
+            self.bandbar.redraw(low, self.bottom, high,
+                                self.bottom + (self.bottom - self.top) * 0.25)
         self.thresholdline.redraw(
             thresh, self.top, thresh, self.bottom)
 
 
+class Heatmap:
+
+    # one color per doubling of the shot count in a bin
+    COLORS = ("#ffffb2", "#fed976", "#feb24c", "#fd8d3c",
+              "#fc4e2a", "#e31a1c", "#bd0026", "#800026")
+
+    def __init__(self, canvas, left, top, size, bins=40):
+        # 2D histogram of impact points drawn into a single PhotoImage
+        self.canvas = canvas
+        self.left = left
+        self.top = top
+        self.size = size
+        self.bins = bins
+        self.counts = [0] * (bins * bins)
+        self.visible = False
+        self.image = None
+        self.object = canvas.create_image(left, top, anchor=Tk.NW, state="hidden")
+        canvas.resize_listeners.append(self.on_resize)
+
+    def add(self, x, y):
+        # x and y are plot coordinates, -1 to 1
+        i = min(int((x + 1) / 2 * self.bins), self.bins - 1)
+        j = min(int((y + 1) / 2 * self.bins), self.bins - 1)
+        k = j * self.bins + i
+        self.counts[k] += 1
+        count = self.counts[k]
+        # the color only changes when the count reaches a power of two
+        if self.visible and count & (count - 1) == 0:
+            self.paint(k)
+
+    def paint(self, k):
+        count = self.counts[k]
+        i = k % self.bins
+        j = k // self.bins
+        width = self.image.width()
+        height = self.image.height()
+        color = self.COLORS[min(count.bit_length() - 1, len(self.COLORS) - 1)]
+        self.image.put(color, to=(
+            i * width // self.bins, j * height // self.bins,
+            (i + 1) * width // self.bins, (j + 1) * height // self.bins))
+
+    def render(self):
+        # full redraw at the current canvas size
+        ratio_width = self.canvas.ratio_width
+        ratio_height = self.canvas.ratio_height
+        self.image = Tk.PhotoImage(
+            width=max(1, int(self.size * ratio_width)),
+            height=max(1, int(self.size * ratio_height)))
+        for k in range(len(self.counts)):
+            if self.counts[k]:
+                self.paint(k)
+        self.canvas.itemconfig(self.object, image=self.image)
+        self.canvas.coords(self.object, self.left * ratio_width, self.top * ratio_height)
+
+    def show(self, visible):
+        self.visible = visible
+        if visible:
+            self.render()
+        self.canvas.itemconfig(self.object, state="normal" if visible else "hidden")
+
+    def on_resize(self):
+        if self.visible:
+            self.render()
+
+
 class Plot:
 
-    def __init__(self, canvas, left, top, size):
+    # density layer shades, one step per doubling of the shot count in a cell
+    DENSITY_COLORS = ("gray90", "gray80", "gray70", "gray60", "gray50", "gray40")
+
+    def __init__(self, canvas, left, top, size, max_points=None, grid=20):
         self.canvas = canvas
-        self.canvas_width_orig = canvas.width
-        self.canvas_height_orig = canvas.height
         self.left = left
         self.top = top
         self.size = size
         self.points = []
+        # bounded mode: keep the last max_points as live ovals and fold
+        # older points into a grid x grid density layer
+        self.max_points = max_points
+        self.grid = grid
+        self.oldest = 0  # next point to recycle once points is full
+        self.latest = None
+        self.previous = None  # point colored as latest at the last update
+        self.threshold = None
+        self.density = {}  # (i, j) -> [count, ResizableRectangle]
+        # live points and density cells share a tag so the heatmap view can
+        # hide them with a single call
+        self.tag = "plot%d" % id(self)
+        self.state = "normal"
+        self.heatmap = Heatmap(canvas, left, top, size)
 
         ResizableRectangle(
             self.canvas,
@@ -226,35 +397,107 @@ class Plot:
         if y < -1:
             y = -1.
         mag = (x**2 + y**2)**0.5
-        x = (x * self.size / 2 + self.x0) * self.canvas.width / (float(self.canvas_width_orig))
-        y = (y * self.size / 2 + self.y0) * self.canvas.height / (float(self.canvas_height_orig))
-        self.points.append(
-            ResizablePlotPoint(
-                self.canvas, x, y, mag, **kwargs))
+        px = x
+        py = y
+        x = x * self.size / 2 + self.x0
+        y = y * self.size / 2 + self.y0
+        if self.max_points is not None and len(self.points) >= self.max_points:
+            # recycle the oldest oval instead of creating a new one
+            point = self.points[self.oldest]
+            self.fold(point.px, point.py)
+            point.x0 = x
+            point.y0 = y
+            point.mag = mag
+            point.redraw()
+            point.itemconfig(fill="dark gray")
+            self.canvas.tag_raise(point.object)
+            self.latest = point
+            self.oldest = (self.oldest + 1) % self.max_points
+        else:
+            if self.max_points is not None:
+                # shots drawn within the same frame start out as older points
+                kwargs.setdefault("fill", "dark gray")
+            self.latest = ResizablePlotPoint(
+                self.canvas, x, y, mag, tags=self.tag, state=self.state, **kwargs)
+            self.points.append(self.latest)
+        self.latest.px = px
+        self.latest.py = py
+        self.heatmap.add(px, py)
+
+    def fold(self, x, y):
+        # Adds a point that left the live set to its density cell
+        i = min(int((x + 1) / 2 * self.grid), self.grid - 1)
+        j = min(int((y + 1) / 2 * self.grid), self.grid - 1)
+        cell = self.density.get((i, j))
+        if cell is None:
+            cell = [0, ResizableRectangle(
+                self.canvas, 0, 0, 0, 0, outline="", tags=self.tag, state=self.state)]
+            step = self.size / float(self.grid)
+            cell[1].redraw(self.left + i * step, self.top + j * step,
+                           self.left + (i + 1) * step, self.top + (j + 1) * step)
+            # keep the density layer below the axes and live points
+            self.canvas.tag_lower(cell[1].object)
+            self.density[(i, j)] = cell
+        cell[0] += 1
+        shade = min(cell[0].bit_length() - 1, len(self.DENSITY_COLORS) - 1)
+        if cell[0] == 1 << shade:
+            cell[1].itemconfig(fill=self.DENSITY_COLORS[shade])
+
+    def show_heatmap(self, visible):
+        # swap the dots and density layer for the binned heatmap
+        self.state = "hidden" if visible else "normal"
+        self.canvas.itemconfig(self.tag, state=self.state)
+        self.heatmap.show(visible)
 
     def update(self, threshold):
-        self.threshold = threshold
-        r = threshold * self.size / 2
-        self.threshold_circle.redraw(
-            self.x0 - r, self.y0 - r, self.x0 + r, self.y0 + r)
-        for i in range(0, len(self.points)):
-            point = self.points[i]
-            if i == (len(self.points) - 1):
-                if point.mag > self.threshold:
-                    color = "red"
+        if threshold != self.threshold:
+            self.threshold = threshold
+            r = threshold * self.size / 2
+            self.threshold_circle.redraw(
+                self.x0 - r, self.y0 - r, self.x0 + r, self.y0 + r)
+        if self.max_points is None:
+            for i in range(0, len(self.points)):
+                point = self.points[i]
+                if i == (len(self.points) - 1):
+                    if point.mag > self.threshold:
+                        color = "red"
+                    else:
+                        color = "green"
                 else:
-                    color = "green"
-            else:
-                color = "dark gray"
-            point.itemconfig(fill=color)
-            point.redraw()
+                    color = "dark gray"
+                point.itemconfig(fill=color)
+                point.redraw()
+            return
+        # bounded mode: only the previous and the new latest point change
+        point = self.latest
+        if point is None:
+            return
+        if self.previous is not None and self.previous is not point:
+            self.previous.itemconfig(fill="dark gray")
+        if point.mag > self.threshold:
+            point.itemconfig(fill="red")
+        else:
+            point.itemconfig(fill="green")
+        self.previous = point
 
 
 class ScoreBars:
 
-    def __init__(self, frame, dcb):
+    def __init__(self, frame, dcb, stats=None, rolling=None):
 
         self.dcb = dcb
+        self.stats = stats
+        self.rolling = rolling
+        self.macaddr = None
+        self.threshold = 0.0
+        self.frame_delay = 16  # ms, about 60 frames per second
+        self.pending_render = None
+        # render time of the last 100 frames, in ms
+        self.frame_times = ringbuffer.RingBuffer(100, (100,))
+        self.frame_max = 0.0
+        self.frames = 0
+        self.shots = 0
+        self.first_render = None  # called after the first shot is drawn
         self.frame = frame
 
         self.canvas = ResizableCanvas(
@@ -268,6 +511,7 @@ class ScoreBars:
         right = 550
         self.bars = []
         self.scores = []
+        self.rolling_texts = []
         self.labels = (
             'Finish',
             'Finesse',
@@ -288,6 +532,15 @@ class ScoreBars:
             "%0.2fs",
             "%0.1fs")
         self.outof = ('/3s', '/10', '/10', '/10', '/10', '/10', '/1s', '/60s')
+        self.metrics = (
+            'freeze',
+            'power',
+            'straightness',
+            'steering',
+            'followthru',
+            'jab',
+            'bspause',
+            'shotpause')
         for i in range(0, 8):
             top = i * 400 / 8. + 10
             bottom = (i + 1) * 400 / 8. - 10
@@ -307,9 +560,18 @@ class ScoreBars:
                           * 0.5, text=self.outof[i], font=("Purisa", 14))
             self.scores.append(ResizableText(
                 self.canvas, left - 55, top + (bottom - top) * 0.5, text="0", font=("Purisa", 18)))
+            if rolling is not None:
+                self.rolling_texts.append(ResizableText(
+                    self.canvas, 100, bottom + 6, text="", font=("Purisa", 8)))
 
         # Plot area
-        self.plot = Plot(self.canvas, 600, 100, 200)
+        self.plot = Plot(self.canvas, 600, 100, 200, max_points=100)
+        self.heatmap = Tk.BooleanVar()
+        Tk.Checkbutton(
+            self.frame,
+            text="Heatmap",
+            variable=self.heatmap,
+            command=self.toggle_heatmap).pack(side=Tk.BOTTOM, anchor=Tk.E)
         ResizableText(
             self.canvas,
             700,
@@ -319,11 +581,34 @@ class ScoreBars:
                 "Purisa",
                 14))
 
+    def seed(self, macaddr):
+        # show the averages and bands known for a device before its first shot
+        if self.stats is None or self.stats.get(macaddr, self.metrics[0]) is None:
+            return
+        for i in range(0, 8):
+            self.bars[i].stats = self.stats.get(macaddr, self.metrics[i])
+        self.macaddr = macaddr
+        self.schedule()
+
+    def toggle_heatmap(self):
+        self.plot.show_heatmap(self.heatmap.get())
+
     def _update_scores(self):
         for i in range(0, 8):
             text = self.score_format[i] % self.bars[i].score
             self.scores[i].itemconfig(text=text)
 
+    def _update_rolling(self, macaddr):
+        for i in range(0, 8):
+            means = self.rolling.means(macaddr, self.metrics[i])
+            if means is None:
+                continue
+            texts = []
+            for label, mean in zip(("Last 10", "50", "Hour"), means):
+                if mean is not None:
+                    texts.append("%s: %s" % (label, self.score_format[i] % mean))
+            self.rolling_texts[i].itemconfig(text="   ".join(texts))
+
     def test(self):
 
         for bar in self.bars:
@@ -337,48 +622,437 @@ class ScoreBars:
         self.plot.plot(x, y)
         self.plot.update(random.random())
 
-    def update(self):
-        dcb = self.dcb
+    def update(self, dcb=None):
+        # dcb is a digicueblue.Snapshot of the shot, or the live decoder
+        if dcb is None:
+            dcb = self.dcb
+
+        if self.stats is not None:
+            for i in range(0, 8):
+                self.bars[i].stats = self.stats.get(dcb.macaddr, self.metrics[i])
 
         self.bars[0].score = dcb.score_freeze
         self.bars[0].threshold = dcb.threshold_freeze
-        self.bars[0].update(dcb.setting_freeze)
+        self.bars[0].enabled = dcb.setting_freeze
 
         self.bars[1].score = dcb.score_power
         self.bars[1].threshold = dcb.threshold_power
-        self.bars[1].update(dcb.setting_power)
+        self.bars[1].enabled = dcb.setting_power
 
         self.bars[2].score = dcb.score_straightness
         self.bars[2].threshold = dcb.threshold_straightness
-        self.bars[2].update(dcb.setting_straightness)
+        self.bars[2].enabled = dcb.setting_straightness
 
         self.bars[3].score = dcb.score_steering
         self.bars[3].threshold = dcb.threshold_steering
-        self.bars[3].update(dcb.setting_steering)
+        self.bars[3].enabled = dcb.setting_steering
 
         self.bars[4].score = dcb.score_followthru
         self.bars[4].threshold = dcb.threshold_followthru
-        self.bars[4].update(dcb.setting_followthru)
+        self.bars[4].enabled = dcb.setting_followthru
 
         self.bars[5].score = dcb.score_jab
         self.bars[5].threshold = dcb.threshold_jab
-        self.bars[5].update(dcb.setting_jab)
+        self.bars[5].enabled = dcb.setting_jab
 
         self.bars[6].score = dcb.score_bspause
         self.bars[6].threshold = dcb.threshold_bspause
-        self.bars[6].update(dcb.setting_bspause)
+        self.bars[6].enabled = dcb.setting_bspause
 
         self.bars[7].score = dcb.score_shotpause
         self.bars[7].threshold = dcb.threshold_shotpause
-        self.bars[7].update(dcb.setting_shotpause)
+        self.bars[7].enabled = dcb.setting_shotpause
 
-        self._update_scores()
+        for bar in self.bars:
+            bar.add()
+        self.macaddr = dcb.macaddr
+        self.shots += 1
 
         x = dcb.impactx / 50.
         y = dcb.impacty / 50.
-        thresh = (50 - 5 * dcb.threshold_straightness) / 50.
+        self.threshold = (50 - 5 * dcb.threshold_straightness) / 50.
         self.plot.plot(x, y)
-        self.plot.update(thresh)
+        self.schedule()
+
+    def schedule(self):
+        # shots arriving within one frame share a single redraw
+        if self.pending_render is None:
+            self.pending_render = self.canvas.after(self.frame_delay, self.render)
+
+    def render(self):
+        self.pending_render = None
+        start = time.perf_counter()
+        for bar in self.bars:
+            bar.draw()
+        self._update_scores()
+        if self.rolling is not None:
+            self._update_rolling(self.macaddr)
+        self.plot.update(self.threshold)
+        elapsed = (time.perf_counter() - start) * 1000
+        self.frame_times.push(elapsed)
+        self.frames += 1
+        if self.frames == 1 and self.first_render is not None:
+            self.first_render()
+        self.frame_max = max(self.frame_max, elapsed)
+
+    def frame_report(self):
+        if self.frame_times.count == 0:
+            return "No frames rendered"
+        return "%d shots in %d frames, mean %.2f ms over the last %d, max %.2f ms" % (
+            self.shots, self.frames, self.frame_times.mean(100),
+            self.frame_times.count, self.frame_max)
+
+
+class DashboardTile:
+
+    # Compact view of one DigiCue Blue: a title and one bar with its score,
+    # fault color and rolling average per metric. 18 canvas items, created
+    # once and reused for whichever cue the tile is assigned to.
+
+    scales = {"shotpause": (60.0, "%0.1fs"), "bspause": (1.0, "%0.2fs"),
+              "jab": (10.0, "%0.1f"), "followthru": (10.0, "%0.1f"),
+              "steering": (10.0, "%0.1f"), "straightness": (10.0, "%0.1f"),
+              "power": (10.0, "%0.1f"), "freeze": (3.0, "%0.2fs")}
+
+    def __init__(self, canvas, metrics):
+        self.canvas = canvas
+        self.metrics = metrics  # DigicueBlue.config_metrics, in ALERT0 bit order
+        self.geometry = (0, 0, 0, 0)
+        self.macaddr = None
+        self.shot = None
+        self.means = None
+        self.shots = 0
+        self.last_seen = 0.0
+        self.dirty = False
+        self.border = ResizableRectangle(canvas, 0, 0, 0, 0)
+        self.title = ResizableText(canvas, 0, 0, anchor=Tk.W, font=("Purisa", 10))
+        self.bars = []
+        self.texts = []
+        for label, metric in metrics:
+            self.bars.append(ResizableRectangle(canvas, 0, 0, 0, 0, fill="gray", outline=""))
+            self.texts.append(ResizableText(canvas, 0, 0, anchor=Tk.W, font=("Purisa", 8)))
+
+    def items(self):
+        return [self.border, self.title] + self.bars + self.texts
+
+    def assign(self, macaddr):
+        self.macaddr = macaddr
+        self.shot = None
+        self.shots = 0
+        for item in self.items():
+            item.itemconfig(state="normal")
+
+    def release(self):
+        self.macaddr = None
+        for item in self.items():
+            item.itemconfig(state="hidden")
+
+    def place(self, left, top, width, height):
+        self.geometry = (left, top, width, height)
+        self.dirty = True
+
+    def update(self, shot, shots, means, now):
+        self.shot = shot
+        self.means = means
+        self.shots = shots
+        self.last_seen = now
+        self.dirty = True
+
+    def draw(self):
+        if not self.dirty:
+            return
+        self.dirty = False
+        left, top, width, height = self.geometry
+        row = height / float(len(self.metrics) + 1)
+        self.border.redraw(left + 2, top + 2, left + width - 2, top + height - 2)
+        self.title.redraw(left + 8, top + row * 0.5)
+        self.title.itemconfig(text="%s   %d shots" % (self.macaddr, self.shots))
+        shot = self.shot
+        for i, (label, metric) in enumerate(self.metrics):
+            scale, score_format = self.scales[metric]
+            y0 = top + row * (i + 1)
+            x0 = left + width * 0.55
+            x1 = left + width - 8
+            if shot is None:
+                self.bars[i].redraw(x0, y0 + 2, x0, y0 + row - 2)
+                self.texts[i].itemconfig(text=label)
+                self.texts[i].redraw(left + 8, y0 + row * 0.5)
+                continue
+            score = getattr(shot, "score_" + metric)
+            if shot.ACONF0 is not None and not (shot.ACONF0 >> i) & 1:
+                color = "gray"
+            elif shot.ALERT0 is not None and (shot.ALERT0 >> i) & 1:
+                color = "red"
+            else:
+                color = "green"
+            fill = min(max(score / scale, 0.0), 1.0)
+            self.bars[i].itemconfig(fill=color)
+            self.bars[i].redraw(x0, y0 + 2, x0 + (x1 - x0) * fill, y0 + row - 2)
+            text = "%s %s" % (label, score_format % score)
+            if self.means is not None and self.means[i] is not None:
+                text += "  avg " + score_format % self.means[i]
+            self.texts[i].itemconfig(text=text)
+            self.texts[i].redraw(left + 8, y0 + row * 0.5)
+
+
+class Dashboard:
+
+    # One tile per active DigiCue Blue, for a wall screen covering several
+    # tables. Shots only record the latest snapshot of their cue; tiles are
+    # refreshed in one batch per frame at a fixed rate. Tiles of cues that
+    # have been quiet for idle seconds go back to a pool for reuse.
+
+    def __init__(self, frame, group, rolling=None, fps=10, idle=900, columns=4):
+        self.group = group
+        self.rolling = rolling
+        self.frame_delay = int(1000 / fps)
+        self.idle = idle
+        self.columns = columns
+        self.metrics = digicueblue.DigicueBlue.config_metrics
+        self.lock = threading.Lock()
+        # macaddr -> (Snapshot, shot count), written by the BGAPI thread
+        self.latest = {}
+        self.counts = {}
+        self.tiles = {}
+        self.pool = []
+        # refresh time of the last 100 frames, in ms
+        self.frame_times = ringbuffer.RingBuffer(100, (100,))
+
+        self.canvas = ResizableCanvas(frame, width=1000, height=600, highlightthickness=0)
+        self.canvas.pack(fill=Tk.BOTH, expand=Tk.YES)
+        self.waiting = ResizableText(
+            self.canvas, 500, 300, text="Waiting for DigiCue Blue shots", font=("Purisa", 14))
+        group.shot_listeners.append(self.add_shot)
+        self.canvas.after(self.frame_delay, self.refresh)
+
+    def add_shot(self, dcb):
+        # called in the BGAPI thread
+        shot = digicueblue.Snapshot(dcb)
+        with self.lock:
+            self.counts[dcb.macaddr] = self.counts.get(dcb.macaddr, 0) + 1
+            self.latest[dcb.macaddr] = (shot, self.counts[dcb.macaddr])
+
+    def refresh(self):
+        start = time.perf_counter()
+        with self.lock:
+            latest = self.latest
+            self.latest = {}
+        now = time.time()
+        layout = False
+        for macaddr, (shot, count) in latest.items():
+            tile = self.tiles.get(macaddr)
+            if tile is None:
+                tile = self.pool.pop() if self.pool else DashboardTile(self.canvas, self.metrics)
+                tile.assign(macaddr)
+                self.tiles[macaddr] = tile
+                layout = True
+            means = None
+            if self.rolling is not None:
+                means = []
+                for label, metric in self.metrics:
+                    window = self.rolling.means(macaddr, metric)
+                    means.append(window[0] if window is not None else None)
+            tile.update(shot, count, means, now)
+        for macaddr, tile in list(self.tiles.items()):
+            if now - tile.last_seen > self.idle:
+                tile.release()
+                self.pool.append(self.tiles.pop(macaddr))
+                layout = True
+        if layout:
+            self.layout()
+        for tile in self.tiles.values():
+            tile.draw()
+        self.frame_times.push((time.perf_counter() - start) * 1000)
+        self.canvas.after(self.frame_delay, self.refresh)
+
+    def layout(self):
+        self.waiting.itemconfig(state="hidden" if self.tiles else "normal")
+        if not self.tiles:
+            return
+        columns = min(self.columns, len(self.tiles))
+        rows = (len(self.tiles) + columns - 1) // columns
+        width = self.canvas.width_orig / float(columns)
+        height = self.canvas.height_orig / float(rows)
+        for n, macaddr in enumerate(sorted(self.tiles)):
+            self.tiles[macaddr].place((n % columns) * width, (n // columns) * height, width, height)
+
+
+class HistoryChart:
+
+    # Time series of one stored metric. Only the shots in view are read,
+    # downsampled to about one point per pixel; the mouse wheel zooms
+    # around the pointer and dragging pans.
+
+    margin = 50
+
+    def __init__(self, frame, dcb):
+        self.dcb = dcb
+        self.metrics = dict(dcb.config_metrics)
+        # stored shots of the selected cue, only touched by the Tk thread
+        self.shots = history.ShotHistory()
+        self.macaddr = None
+        self.loaded = False
+        # data.csv is read in a worker thread, see load()
+        self.generation = 0
+        self.view = None  # (first, last) timestamps in ns
+        self.pending_draw = None
+        self.drag = None
+
+        controls = Tk.Frame(frame)
+        controls.pack(fill=Tk.X)
+        self.metric = Tk.StringVar(controls)
+        self.metric.set("Jab")
+        Tk.OptionMenu(
+            controls,
+            self.metric,
+            *[label for label, metric in dcb.config_metrics],
+            command=self.select).pack(side=Tk.LEFT)
+        Tk.Button(controls, text="Reload", command=self.load).pack(side=Tk.LEFT)
+        Tk.Button(controls, text="Show All", command=self.show_all).pack(side=Tk.LEFT)
+        self.status = Tk.StringVar(controls)
+        Tk.Label(controls, textvariable=self.status).pack(side=Tk.LEFT)
+
+        self.canvas = Tk.Canvas(frame, width=810, height=400, highlightthickness=0)
+        self.canvas.pack(fill=Tk.BOTH, expand=Tk.YES)
+        self.frame = self.canvas.create_rectangle(0, 0, 0, 0)
+        self.line = self.canvas.create_line(0, 0, 0, 0, fill="blue", state="hidden")
+        self.text_high = self.canvas.create_text(0, 0, anchor=Tk.E, font=("Purisa", 8))
+        self.text_low = self.canvas.create_text(0, 0, anchor=Tk.E, font=("Purisa", 8))
+        self.text_first = self.canvas.create_text(0, 0, anchor=Tk.NW, font=("Purisa", 8))
+        self.text_last = self.canvas.create_text(0, 0, anchor=Tk.NE, font=("Purisa", 8))
+
+        self.canvas.bind("<Configure>", self.schedule)
+        self.canvas.bind("<MouseWheel>", self.on_wheel)
+        self.canvas.bind("<Button-4>", self.on_wheel)
+        self.canvas.bind("<Button-5>", self.on_wheel)
+        self.canvas.bind("<ButtonPress-1>", self.on_press)
+        self.canvas.bind("<B1-Motion>", self.on_drag)
+
+    def load(self):
+        # a large data.csv takes a while to parse; the Tk thread must not
+        # wait for it, as GUI.push makes the BGAPI thread wait for Tk
+        self.macaddr = self.dcb.macaddr_filter
+        self.generation += 1
+        self.status.set("Loading stored shots...")
+        result = []  # the worker appends the ShotHistory when done
+        threading.Thread(target=self.read_shots, args=(self.macaddr, result), daemon=True).start()
+        self.canvas.after(50, self.poll_load, self.generation, result)
+
+    def read_shots(self, macaddr, result):
+        # worker thread
+        shots = history.ShotHistory()
+        try:
+            self.dcb.file_import(macaddr=macaddr, shots=shots)
+        except (IOError, OSError):
+            pass
+        result.append(shots)
+
+    def poll_load(self, generation, result):
+        if generation != self.generation:
+            return  # a newer load took over
+        if not result:
+            self.canvas.after(50, self.poll_load, generation, result)
+            return
+        self.shots = result[0]
+        self.loaded = True
+        self.view = None
+        self.show_all()
+
+    def select_macaddr(self, macaddr):
+        if macaddr != self.macaddr:
+            self.load()
+
+    def show_all(self):
+        dates = self.shots.column("date")
+        if len(dates):
+            # at least a minute, so a single shot still has a time axis
+            self.view = (dates[0], max(dates[-1], dates[0] + 60 * 10**9))
+        self.schedule()
+
+    def select(self, label=None):
+        self.schedule()
+
+    def schedule(self, event=None):
+        if self.pending_draw is None:
+            self.pending_draw = self.canvas.after_idle(self.draw)
+
+    def width(self):
+        return max(self.canvas.winfo_width() - 2 * self.margin, 3)
+
+    def draw(self):
+        self.pending_draw = None
+        start_time = time.perf_counter()
+        width = self.width()
+        height = max(self.canvas.winfo_height() - 2 * self.margin, 3)
+        left = self.margin
+        top = self.margin
+        self.canvas.coords(self.frame, left, top, left + width, top + height)
+
+        dates = self.shots.column("date")
+        if self.view is None or not len(dates):
+            self.canvas.itemconfig(self.line, state="hidden")
+            self.status.set("No stored shots" if self.loaded else "Loading stored shots...")
+            return
+        values = self.shots.column(self.metrics[self.metric.get()])
+        first, last = self.view
+        start, end = downsample.visible(dates, first, last)
+        rows = downsample.chart(dates, values, start, end, width)
+
+        if rows:
+            low = min(values[row] for row in rows)
+            high = max(values[row] for row in rows)
+        else:
+            low = high = 0.0
+        if high - low < 1e-6:
+            high = low + 1.0
+        sx = width / float(last - first)
+        sy = height / (high - low)
+        coords = []
+        for row in rows:
+            coords.append(left + (dates[row] - first) * sx)
+            coords.append(top + height - (values[row] - low) * sy)
+        if len(coords) >= 4:
+            self.canvas.coords(self.line, *coords)
+            self.canvas.itemconfig(self.line, state="normal")
+        else:
+            self.canvas.itemconfig(self.line, state="hidden")
+
+        self.canvas.coords(self.text_high, left - 5, top)
+        self.canvas.itemconfig(self.text_high, text="%.2f" % high)
+        self.canvas.coords(self.text_low, left - 5, top + height)
+        self.canvas.itemconfig(self.text_low, text="%.2f" % low)
+        self.canvas.coords(self.text_first, left, top + height + 5)
+        self.canvas.itemconfig(self.text_first, text=history.from_ns(first).strftime("%Y-%m-%d %H:%M"))
+        self.canvas.coords(self.text_last, left + width, top + height + 5)
+        self.canvas.itemconfig(self.text_last, text=history.from_ns(last).strftime("%Y-%m-%d %H:%M"))
+        self.status.set("%d of %d shots, %d points drawn in %.0f ms" % (
+            end - start, len(dates), len(rows), (time.perf_counter() - start_time) * 1000))
+
+    def on_wheel(self, event):
+        if self.view is None:
+            return
+        if event.num == 4 or getattr(event, "delta", 0) > 0:
+            factor = 0.8  # zoom in
+        else:
+            factor = 1.25
+        first, last = self.view
+        x = min(max(event.x - self.margin, 0), self.width())
+        pointer = first + (last - first) * x / float(self.width())
+        span = max((last - first) * factor, 60 * 10**9)
+        first = pointer - (pointer - first) * span / float(last - first)
+        self.view = (int(first), int(first + span))
+        self.schedule()
+
+    def on_press(self, event):
+        self.drag = (event.x, self.view)
+
+    def on_drag(self, event):
+        if self.drag is None or self.drag[1] is None:
+            return
+        x, (first, last) = self.drag
+        shift = int((x - event.x) * (last - first) / float(self.width()))
+        self.view = (first + shift, last + shift)
+        self.schedule()
 
 
 class OptionList_Command_MacAddr:
@@ -391,31 +1065,81 @@ class OptionList_Command_MacAddr:
         self.parent.macaddrs.set(value)
         self.parent.macaddr = value
         self.parent.dcb.macaddr_filter = value
+        if self.parent.history is not None:
+            self.parent.history.select_macaddr(value)
 
 
 class GUI:
 
-    def __init__(self, master, dcb):
+    def __init__(self, master, dcb, stats=None, rolling=None, start=None):
 
         # All variables from DigiCue Blue are exposed through class variables
         # in dcb
 
         self.dcb = dcb
-        self.packet_count = dcb.packet_count
+        self.stats = stats
         self.master = master
-        master.after(500, self.timer)  # register timer
+        # state of the last packet, as seen by the Tk thread
+        self.snapshot = digicueblue.Snapshot(dcb)
         master.title("DigiCue Blue BLED112 GUI - Version %s" % VERSION)
 
         self.tabs = ttk.Notebook(master)
         self.tab1 = Tk.Frame(self.tabs, padx=10, pady=10)
+        self.tab2 = Tk.Frame(self.tabs, padx=10, pady=10)
         self.tab3 = Tk.Frame(self.tabs, padx=10, pady=10)
         self.tab5 = Tk.Frame(self.tabs, padx=10, pady=10)
         self.tabs.add(self.tab1, text='Shots')
+        self.tabs.add(self.tab2, text='History')
         self.tabs.add(self.tab3, text='Configure')
         self.tabs.add(self.tab5, text='Help')
         self.tabs.pack(fill=Tk.BOTH, expand=Tk.YES)
 
-        # Help tab
+        # Only the Shots tab is built up front, the others are built the
+        # first time they are selected
+        self.builders = {
+            str(self.tab2): self.build_history,
+            str(self.tab3): self.build_configure,
+            str(self.tab5): self.build_help}
+        self.tabs.bind("<<NotebookTabChanged>>", self.tab_changed)
+
+        # MAC address and configuration state lives in variables, so
+        # packets can update it before the Configure tab exists
+        self.macaddr = None
+        self.macaddrs_list = []
+        self.macaddr_commands = []
+        self.macaddrs = Tk.StringVar(master)
+        self.macaddrs.set("<Auto Detect>")
+        self.macaddrs_combo = None
+        self.options_configig = {}
+        for label, modes in dcb.config_options:
+            self.options_configig[label] = Tk.StringVar(master)
+        self.sync_label = Tk.StringVar(master)
+        self.sync_label.set("Press button on DigiCue Blue once to detect")
+        self.history = None
+
+        # Shots tab
+        self.scorebars = ScoreBars(self.tab1, dcb, stats, rolling)
+        master.bind("<F2>", self.print_frame_report)
+
+        # startup timing, measured from start (a time.perf_counter() value)
+        self.start = start
+        self.visible_time = None
+        self.first_shot_time = None
+        if start is not None:
+            master.bind("<Map>", self.on_map, add="+")
+            self.scorebars.first_render = self.on_first_shot
+
+        # Packets and new devices are pushed from the BGAPI thread through a
+        # queue; <<Shot>> wakes the Tk thread up to drain it
+        self.queue = queue.Queue()
+        master.bind("<<Shot>>", self.drain)
+        dcb.device_listeners.append(self.push_device)
+        dcb.packet_listeners.append(self.push_packet)
+        for macaddr in list(dcb.devices_seen):
+            self.queue.put(("device", macaddr))
+        master.after_idle(self.drain)
+
+    def build_help(self):
         message = helptext.help
         frame = Tk.Frame(self.tab5)
         text = Tk.Text(frame, height=30, width=100, wrap=Tk.WORD)
@@ -427,19 +1151,18 @@ class GUI:
         frame.pack(side=Tk.TOP)
         text.config(state=Tk.DISABLED)
 
+    def build_configure(self):
         # Mac addr select
         frame = Tk.Frame(self.tab3)
         frame.pack(fill=Tk.X)
-        self.macaddr = None
-        self.macaddrs_list = []
-        self.macaddr_commands = []
         lbl = Tk.Label(frame, text="DigiCue Blue MAC Address", width=25)
         lbl.pack(side=Tk.LEFT)
-        self.macaddrs = Tk.StringVar(frame)
-        self.macaddrs.set("<Auto Detect>")
         self.macaddrs_combo = Tk.OptionMenu(
             frame, self.macaddrs, "<Auto Detect>")
         self.macaddrs_combo.pack(side=Tk.LEFT)
+        if self.macaddrs_list:
+            self.refresh_macaddrs()
+            self.macaddrs.set(self.macaddr)
 
         # Configuration selection
         frame = Tk.Frame(self.tab3)
@@ -447,15 +1170,14 @@ class GUI:
         label = Tk.Label(frame, text="Configure")
         label.pack(side=Tk.LEFT)
 
-        self.options_configig = {}
         fbox = Tk.Frame(self.tab3, relief=Tk.GROOVE, bd=2)
         fbox.pack(fill=Tk.X)
-        for label, modes in dcb.config_options:
+        for label, modes in self.dcb.config_options:
             frame = Tk.Frame(fbox)
             frame.pack(fill=Tk.X)
             lbl = Tk.Label(frame, text=label, width=25)
             lbl.pack(side=Tk.LEFT)
-            v = Tk.StringVar()
+            v = self.options_configig[label]
             b = Tk.Radiobutton(
                 frame,
                 text="Off",
@@ -476,40 +1198,103 @@ class GUI:
                         width=10,
                         command=self.check_setting_config)
                     b.pack(side=Tk.LEFT)
-            self.options_configig[label] = v
         frame = Tk.Frame(fbox, pady=10)
         frame.pack(fill=Tk.X)
         lbl = Tk.Label(frame, text="", width=25)
         lbl.pack(side=Tk.LEFT)
-        self.sync_label = Tk.StringVar(frame)
-        self.sync_label.set("Press button on DigiCue Blue once to detect")
         lbl = Tk.Label(frame, textvariable=self.sync_label)
         lbl.pack(side=Tk.LEFT)
 
-        # Shots tab
-        self.scorebars = ScoreBars(self.tab1, dcb)
+    def build_history(self):
+        # stored shots are read when the tab is first shown
+        self.history = HistoryChart(self.tab2, self.dcb)
+        self.history.load()
+
+    def tab_changed(self, event=None):
+        build = self.builders.pop(self.tabs.select(), None)
+        if build is not None:
+            build()
+
+    def on_map(self, event):
+        if self.visible_time is None:
+            self.visible_time = time.perf_counter() - self.start
+            print("Window visible after %.0f ms" % (self.visible_time * 1000))
+
+    def on_first_shot(self):
+        self.first_shot_time = time.perf_counter() - self.start
+        print("First shot displayed after %.0f ms" % (self.first_shot_time * 1000))
+
+    def print_frame_report(self, event=None):
+        print("Shots tab: %s" % self.scorebars.frame_report())
+
+    def push(self, item):
+        # called in the BGAPI thread
+        self.queue.put(item)
+        try:
+            self.master.event_generate("<<Shot>>", when="tail")
+        except (RuntimeError, Tk.TclError):
+            pass  # window closed or main loop not running yet
+
+    def push_device(self, dcb, macaddr):
+        self.push(("device", macaddr))
+
+    def push_packet(self, dcb):
+        self.push(("packet", digicueblue.Snapshot(dcb)))
+
+    def drain(self, event=None):
+        while True:
+            try:
+                kind, item = self.queue.get_nowait()
+            except queue.Empty:
+                return
+            if kind == "device":
+                self.add_macaddr(item)
+            else:
+                self.snapshot = item
+
+                # Update configuration
+                self.refresh_setting_config()
+
+                # Update graphics here
+                if item.data_type == 1:  # update gui if data packet
+                    self.scorebars.update(item)
+
+    def add_macaddr(self, macaddr):
+        # Only DigiCue Blue devices / correct manuf. ID get here
+        if macaddr in self.macaddrs_list:
+            return
+        self.macaddrs_list.append(macaddr)
+        if self.macaddr is None:
+            # keep a device selected before the GUI started
+            self.macaddr = self.dcb.macaddr_filter or macaddr
+            self.dcb.macaddr_filter = self.macaddr
+            self.scorebars.seed(self.macaddr)
+            if self.history is not None:
+                self.history.select_macaddr(self.macaddr)
+        self.refresh_macaddrs()
+        self.macaddrs.set(self.macaddr)
 
     def refresh_setting_config(self):
         self.options_configig["Shot Interval"].set(
-            self.dcb.threshset_shotpause if self.dcb.setting_shotpause else -1)
+            self.snapshot.threshset_shotpause if self.snapshot.setting_shotpause else -1)
         self.options_configig["Backstroke Pause"].set(
-            self.dcb.threshset_bspause if self.dcb.setting_bspause else -1)
+            self.snapshot.threshset_bspause if self.snapshot.setting_bspause else -1)
         self.options_configig["Jab"].set(
-            self.dcb.threshset_jab if self.dcb.setting_jab else -1)
+            self.snapshot.threshset_jab if self.snapshot.setting_jab else -1)
         self.options_configig["Follow Through"].set(
-            self.dcb.threshset_followthru if self.dcb.setting_followthru else -1)
+            self.snapshot.threshset_followthru if self.snapshot.setting_followthru else -1)
         self.options_configig["Tip Steer"].set(
-            self.dcb.threshset_steering if self.dcb.setting_steering else -1)
+            self.snapshot.threshset_steering if self.snapshot.setting_steering else -1)
         self.options_configig["Straightness"].set(
-            self.dcb.threshset_straightness if self.dcb.setting_straightness else -1)
+            self.snapshot.threshset_straightness if self.snapshot.setting_straightness else -1)
         self.options_configig["Finesse"].set(
-            self.dcb.threshset_power if self.dcb.setting_power else -1)
+            self.snapshot.threshset_power if self.snapshot.setting_power else -1)
         self.options_configig["Finish"].set(
-            self.dcb.threshset_freeze if self.dcb.setting_freeze else -1)
+            self.snapshot.threshset_freeze if self.snapshot.setting_freeze else -1)
         self.options_configig["Vibrate On Pass"].set(
-            self.dcb.setting_vop if self.dcb.setting_vop else -1)
+            self.snapshot.setting_vop if self.snapshot.setting_vop else -1)
         self.options_configig["Disable All Vibrations"].set(
-            self.dcb.setting_dvibe if self.dcb.setting_dvibe else -1)
+            self.snapshot.setting_dvibe if self.snapshot.setting_dvibe else -1)
         self.check_setting_config()
 
     def check_setting_config(self):
@@ -531,68 +1316,70 @@ class GUI:
         def val(x): return -2 if len(x) == 0 else x
 
         tmp = int(val(self.options_configig["Shot Interval"].get()))
-        if self.dcb.setting_shotpause:
-            a += int(tmp == self.dcb.threshset_shotpause)
+        if self.snapshot.setting_shotpause:
+            a += int(tmp == self.snapshot.threshset_shotpause)
         else:
             a += int(tmp == -1)
 
         tmp = int(val(self.options_configig["Backstroke Pause"].get()))
-        if self.dcb.setting_bspause:
-            a += int(tmp == self.dcb.threshset_bspause)
+        if self.snapshot.setting_bspause:
+            a += int(tmp == self.snapshot.threshset_bspause)
         else:
             a += int(tmp == -1)
 
         tmp = int(val(self.options_configig["Jab"].get()))
-        if self.dcb.setting_jab:
-            a += int(tmp == self.dcb.threshset_jab)
+        if self.snapshot.setting_jab:
+            a += int(tmp == self.snapshot.threshset_jab)
         else:
             a += int(tmp == -1)
 
         tmp = int(val(self.options_configig["Follow Through"].get()))
-        if self.dcb.setting_followthru:
-            a += int(tmp == self.dcb.threshset_followthru)
+        if self.snapshot.setting_followthru:
+            a += int(tmp == self.snapshot.threshset_followthru)
         else:
             a += int(tmp == -1)
 
         tmp = int(val(self.options_configig["Tip Steer"].get()))
-        if self.dcb.setting_steering:
-            a += int(tmp == self.dcb.threshset_steering)
+        if self.snapshot.setting_steering:
+            a += int(tmp == self.snapshot.threshset_steering)
         else:
             a += int(tmp == -1)
 
         tmp = int(val(self.options_configig["Straightness"].get()))
-        if self.dcb.setting_straightness:
-            a += int(tmp == self.dcb.threshset_straightness)
+        if self.snapshot.setting_straightness:
+            a += int(tmp == self.snapshot.threshset_straightness)
         else:
             a += int(tmp == -1)
 
         tmp = int(val(self.options_configig["Finesse"].get()))
-        if self.dcb.setting_power:
-            a += int(tmp == self.dcb.threshset_power)
+        if self.snapshot.setting_power:
+            a += int(tmp == self.snapshot.threshset_power)
         else:
             a += int(tmp == -1)
 
         tmp = int(val(self.options_configig["Finish"].get()))
-        if self.dcb.setting_freeze:
-            a += int(tmp == self.dcb.threshset_freeze)
+        if self.snapshot.setting_freeze:
+            a += int(tmp == self.snapshot.threshset_freeze)
         else:
             a += int(tmp == -1)
 
         tmp = int(val(self.options_configig["Vibrate On Pass"].get()))
-        if self.dcb.setting_vop:
-            a += int(tmp == self.dcb.setting_vop)
+        if self.snapshot.setting_vop:
+            a += int(tmp == self.snapshot.setting_vop)
         else:
             a += int(tmp == -1)
 
         tmp = int(val(self.options_configig["Disable All Vibrations"].get()))
-        if self.dcb.setting_dvibe:
-            a += int(tmp == self.dcb.setting_dvibe)
+        if self.snapshot.setting_dvibe:
+            a += int(tmp == self.snapshot.setting_dvibe)
         else:
             a += int(tmp == -1)
 
         return a == 10
 
     def refresh_macaddrs(self):
+        if self.macaddrs_combo is None:
+            return  # Configure tab not built yet
         self.macaddrs.set('')
         self.macaddrs_combo['menu'].delete(0, 'end')
         self.macaddr_commands = []
@@ -602,28 +1389,3 @@ class GUI:
             command = Tk._setit(optioncmd, choice)
             self.macaddrs_combo['menu'].add_command(
                 label=choice, command=command)
-
-    def timer(self):
-        if self.dcb.macaddr not in self.macaddrs_list:
-            if self.dcb.macaddr != None:
-                # Only add DigiCue Blue devices / correct manuf. ID
-                self.macaddrs_list.append(self.dcb.macaddr)
-                if self.macaddr is None:
-                    self.macaddr = self.dcb.macaddr
-                    self.dcb.macaddr_filter = self.macaddr
-                self.refresh_macaddrs()
-                self.macaddrs.set(self.macaddr)
-
-        if self.packet_count != self.dcb.packet_count:
-            self.packet_count = self.dcb.packet_count
-
-            # Update configuration
-            self.refresh_setting_config()
-
-            # Update graphics here
-            if self.dcb.data_type == 0:  # Version packet
-                pass
-            elif self.dcb.data_type == 1:  # update gui if data packet
-                self.scorebars.update()
-
-        self.master.after(500, self.timer)
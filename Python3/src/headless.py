@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Headless DigiCue Blue logger
+Runs only the serial, BGAPI, decode and persist pipeline of main.py, for
+servers and Raspberry Pis without a display. Nothing on this module's
+import path imports tkinter. Shots go to data.csv, sessions.jsonl, the
+daily/weekly rollups and data.summary.json exactly as in the GUI, and with
+--publish to local subscribers over a Unix domain socket (see pubsub.py).
+
+The DigiCue Blue is selected with --mac, or else the first one seen.
+"""
+
+import time
+START = time.perf_counter()
+
+import sys
+import argparse
+import traceback
+
+import serial
+import bgapi
+import digicueblue
+import stats
+import sessions
+import rollups
+import pubsub
+
+
+def read_comport(filename="comport.cfg"):
+    with open(filename, "r") as f:
+        return f.readline().strip()
+
+
+def resident_memory():
+    # peak resident set size in MB, or None where the resource module is
+    # missing (Windows)
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return rss / (1024.0 * 1024)  # bytes
+    return rss / 1024.0  # kilobytes
+
+
+def startup_report(start, mode):
+    text = "%s mode started in %.0f ms" % (mode, (time.perf_counter() - start) * 1000)
+    rss = resident_memory()
+    if rss is not None:
+        text += ", %.1f MB resident" % rss
+    return text
+
+
+class DeviceLock():
+
+    # device listener locking the decoder to one DigiCue Blue
+
+    def __init__(self, macaddr=None):
+        self.macaddr = macaddr
+
+    def seen(self, dcb, macaddr):
+        if dcb.macaddr_filter is None and (self.macaddr is None or self.macaddr == macaddr):
+            dcb.macaddr_filter = macaddr
+            print("Listening to DigiCue Blue %s" % macaddr)
+
+
+def print_shot(dcb):
+    print("%s  Jab %.1f  Follow through %.1f  Tip steer %.1f%s  Straightness %.1f  Finesse %.1f  Finish %.2f" % (
+        dcb.timestamp.strftime("%H:%M:%S"), dcb.score_jab, dcb.score_followthru,
+        dcb.score_steering, dcb.score_steering_direction, dcb.score_straightness,
+        dcb.score_power, dcb.score_freeze))
+
+
+def main(argv=None, start=START):
+    parser = argparse.ArgumentParser(description='Log DigiCue Blue shots without the GUI')
+    parser.add_argument('-p', '--port', help='BLED112 serial port (default: read from comport.cfg)')
+    parser.add_argument('-m', '--mac', help='MAC address of the DigiCue Blue (default: the first one seen)')
+    parser.add_argument('-f', '--file', default='data.csv', help='shot store (default: data.csv)')
+    parser.add_argument('-q', '--quiet', action='store_true', help='do not print shots')
+    parser.add_argument('--publish', nargs='?', const='digicue.sock', metavar='SOCKET',
+                        help='publish live shots on a Unix domain socket (default: digicue.sock)')
+    parser.add_argument('--encoding', default='ndjson', choices=sorted(pubsub.ENCODERS),
+                        help='encoding of published shots (default: ndjson)')
+    parser.add_argument('--profile', default='default', choices=sorted(bgapi.CONNECTION_PROFILES),
+                        help='connection parameters for configuration syncs (default: default)')
+    parser.add_argument('--update', choices=sorted(bgapi.CONNECTION_PROFILES),
+                        help='connection parameters to request right after connecting')
+    args = parser.parse_args(argv)
+
+    comport = args.port
+    if comport is None:
+        try:
+            comport = read_comport()
+        except (IOError, OSError):
+            print("No serial port given and comport.cfg not found. Use -p, or run main.py once to select the port.")
+            return 1
+
+    try:
+        print("Opening %s" % comport)
+        ser = serial.Serial(comport, 115200, timeout=1, writeTimeout=1)
+    except serial.SerialException:
+        print(traceback.format_exc())
+        print("Please make sure the BLED112 dongle is plugged into %s "
+              "and that no other programs are using the port." % comport)
+        return 1
+
+    dcb = digicueblue.DigicueBlue(filename=args.file, debugprint=False)
+    dcb.device_listeners.append(DeviceLock(args.mac and args.mac.upper()).seen)
+    dcb.shot_listeners.append(sessions.Sessionizer("sessions.jsonl").add_shot)
+    dcb.shot_listeners.append(rollups.Rollups().add_shot)
+    summary = stats.open_summary(args.file)
+    if summary is not None:
+        dcb.shot_listeners.append(summary.add_shot)
+    if not args.quiet:
+        dcb.shot_listeners.append(print_shot)
+    publisher = None
+    if args.publish:
+        try:
+            publisher = pubsub.ShotPublisher(args.publish, args.encoding)
+            publisher.start()
+            dcb.shot_listeners.append(publisher.add_shot)
+            print("Publishing shots on %s" % args.publish)
+        except OSError as e:
+            print("Cannot publish shots on %s: %s" % (args.publish, e))
+            publisher = None
+
+    print(startup_report(start, "Headless"))
+    try:
+        bgapi.Bluegiga(dcb, ser, debugprint=True, profile=args.profile, update_profile=args.update).run()
+    finally:
+        ser.close()
+        if publisher is not None:
+            publisher.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
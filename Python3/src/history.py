@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Columnar shot history
+Per-instance in-memory shot history with one array.array per column:
+timestamps as int64 nanoseconds, scores as float32, the tip steer
+direction as a byte code and configuration/alert bytes as int16 (-1 when
+not stored). About 55 bytes per shot instead of several hundred for lists
+of boxed floats and datetimes.
+
+Columns are preallocated and doubled when full, so appends are amortized
+O(1). column() returns a zero-copy memoryview of the shots stored when
+it was called. The view stays valid across growth, because grow() copies
+into new arrays instead of resizing the ones that are exported; it never
+includes shots appended later, so call column() again for those.
+"""
+
+import datetime
+from array import array
+
+# steering direction byte codes
+DIRECTIONS = {"C": 0, "L": 1, "R": 2}
+DIRECTION_NAMES = "CLR"
+
+SCORES = ("shotpause", "bspause", "jab", "followthru", "steering",
+          "straightness", "power", "freeze", "impactx", "impacty")
+CONFIG = ("aconf1", "aconf2", "alert0")
+
+
+def to_ns(date):
+    return int(round(date.timestamp() * 1e6)) * 1000
+
+
+def from_ns(ns):
+    return datetime.datetime.fromtimestamp(ns // 1000 / 1e6)
+
+
+class ShotHistory():
+
+    def __init__(self, capacity=1024):
+        self.count = 0
+        self.capacity = capacity
+        self.columns = {"date": array('q', [0]) * capacity,
+                        "steering_direction": array('b', [0]) * capacity}
+        for name in SCORES:
+            self.columns[name] = array('f', [0.0]) * capacity
+        for name in CONFIG:
+            self.columns[name] = array('h', [-1]) * capacity
+
+    def __len__(self):
+        return self.count
+
+    def grow(self):
+        # copy into new arrays so views handed out earlier stay valid
+        for name, column in self.columns.items():
+            grown = array(column.typecode, column)
+            grown.extend(column)
+            self.columns[name] = grown
+        self.capacity *= 2
+
+    def append(self, date, scores, direction, config=(None, None, None)):
+        if self.count == self.capacity:
+            self.grow()
+        i = self.count
+        columns = self.columns
+        columns["date"][i] = to_ns(date)
+        columns["steering_direction"][i] = DIRECTIONS.get(direction, 0)
+        for name, value in zip(SCORES, scores):
+            columns[name][i] = value
+        for name, value in zip(CONFIG, config):
+            columns[name][i] = -1 if value is None else value
+        self.count += 1
+
+    def add_shot(self, dcb):
+        # usable as a DigicueBlue shot listener
+        self.append(dcb.timestamp,
+                    [getattr(dcb, "score_" + name) for name in SCORES[:8]] + [dcb.impactx, dcb.impacty],
+                    dcb.score_steering_direction,
+                    (dcb.ACONF1, dcb.ACONF2, dcb.ALERT0))
+
+    def column(self, name):
+        """Zero-copy view of one column as of this call; it stays valid
+        when the history grows but does not include later shots"""
+        return memoryview(self.columns[name])[:self.count]
+
+    def date(self, i):
+        return from_ns(self.columns["date"][i])
+
+    def direction(self, i):
+        return DIRECTION_NAMES[self.columns["steering_direction"][i]]
+
+    def nbytes(self):
+        return sum(column.itemsize * self.count for column in self.columns.values())
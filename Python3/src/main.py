@@ -3,22 +3,33 @@
 #Python 3 required
 # Nathan Rhoades 4/13/2021
 
+import time
+START = time.perf_counter()
+
 import serial
-import serialport
 import bgapi
-import gui
 import digicueblue
+import headless
+import engine
+import stats
+import sessions
+import rollups
+import ringbuffer
 import traceback
-import time
 import threading
+import multiprocessing
 import sys
 
-import tkinter as Tk
+# gui, serialport and tkinter are imported only when the GUI is started,
+# so "main.py --headless" never loads Tk
+
 
 class App(threading.Thread):  # thread GUI to that BGAPI can run in background
 
-    def __init__(self, dcb):
+    def __init__(self, dcb, stats=None, rolling=None):
         self.dcb = dcb
+        self.stats = stats
+        self.rolling = rolling
         threading.Thread.__init__(self)
         self.start()
 
@@ -26,28 +37,93 @@ class App(threading.Thread):  # thread GUI to that BGAPI can run in background
         self.root.quit()
 
     def run(self):
+        import tkinter as Tk
+        import gui
         self.root = Tk.Tk()
-        self.gui = gui.GUI(self.root, self.dcb)
+        self.gui = gui.GUI(self.root, self.dcb, self.stats, self.rolling, START)
+        self.root.after_idle(self.report)
         self.root.mainloop()
 
+    def report(self):
+        print(headless.startup_report(START, "GUI"))
+
+
+class DashboardApp(threading.Thread):  # one tile per cue, see gui.Dashboard
+
+    def __init__(self, group, rolling=None):
+        self.group = group
+        self.rolling = rolling
+        threading.Thread.__init__(self)
+        self.start()
+
+    def run(self):
+        import tkinter as Tk
+        import gui
+        self.root = Tk.Tk()
+        self.root.title("DigiCue Blue Dashboard - Version %s" % gui.VERSION)
+        self.dashboard = gui.Dashboard(self.root, self.group, self.rolling)
+        self.root.mainloop()
+
+
+def launch_selection():
+    import serialport
+    serialport.launch_selection()
+
 
 def main():
 
+    if "--headless" in sys.argv[1:]:
+        argv = [arg for arg in sys.argv[1:] if arg != "--headless"]
+        return headless.main(argv, START)
+    # --split runs the GUI in its own process, see engine.py
+    split = "--split" in sys.argv[1:]
+    # --dashboard shows every cue in range at once
+    dashboard = "--dashboard" in sys.argv[1:]
+    # --warm starts the averages from every stored shot, see stats.SummaryCache
+    warm = "--warm" in sys.argv[1:]
+
     try:
         f = open("comport.cfg", "r")
         comport = f.readline().strip(' ')
         f.close()
     except BaseException:
         # open comport selection gui
-        serialport.launch_selection()
+        launch_selection()
         return
     try:
         # open serial port and launch application
         print("Opening %s" % comport)
         ser = serial.Serial(comport, 115200, timeout=1, writeTimeout=1)
-        dcb = digicueblue.DigicueBlue(filename="data.csv", debugprint=False)
-        app = App(dcb)
+        if dashboard:
+            dcb = digicueblue.DigicueBlueGroup(filename="data.csv", debugprint=False)
+        else:
+            dcb = digicueblue.DigicueBlue(filename="data.csv", debugprint=False)
+        dcb.shot_listeners.append(sessions.Sessionizer("sessions.jsonl").add_shot)
+        dcb.shot_listeners.append(rollups.Rollups().add_shot)
+        summary = stats.open_summary("data.csv")
+        if summary is not None:
+            dcb.shot_listeners.append(summary.add_shot)
         bg = bgapi.Bluegiga(dcb, ser, debugprint=True)
+        if dashboard:
+            rolling = ringbuffer.RollingShots()
+            dcb.shot_listeners.append(rolling.add_shot)
+            app = DashboardApp(dcb, rolling)
+        elif split:
+            # closing the window stops bg
+            engine.Engine(dcb, on_close=bg.stop).start()
+        else:
+            if warm and summary is not None:
+                shot_stats = summary.stats
+            else:
+                shot_stats = stats.ShotStats()
+                dcb.shot_listeners.append(shot_stats.add_shot)
+            rolling = ringbuffer.RollingShots()
+            dcb.shot_listeners.append(rolling.add_shot)
+            app = App(dcb, shot_stats, rolling)
+        bg.run()
+        ser.close()
+    except KeyboardInterrupt:
+        ser.close()
     except BaseException:
         print(traceback.format_exc())
         try:
@@ -60,8 +136,10 @@ def main():
         text = text.replace('\n', ' ')
         text = text.replace('\t', '')
         print(text)
-        serialport.launch_selection()
+        launch_selection()
 
 
 if __name__ == '__main__':
+    # the GUI process of --split in a frozen executable
+    multiprocessing.freeze_support()
     main()
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Live shot stream over a Unix domain socket
+ShotPublisher is a DigicueBlue shot listener that fans every decoded shot
+out to any number of local subscribers (scoreboards, video overlays,
+loggers) connected to a Unix domain socket, so they no longer tail
+data.csv.
+
+The shot listener only appends a tuple to a deque, whatever the number of
+subscribers. A fan-out thread encodes each shot once and queues it for
+every subscriber in a deque(maxlen=backlog); a subscriber that falls
+behind loses its oldest shots, never the decoder or other subscribers.
+How many it lost is printed when it disconnects.
+
+A subscriber first receives one header line, b"DIGICUE1 <encoding>\\n",
+and then shots encoded as:
+
+ndjson   one JSON object per line
+binary   2 byte little-endian length, then a SHOT record
+
+    python pubsub.py             print the shots published on digicue.sock
+"""
+
+import os
+import sys
+import json
+import socket
+import struct
+import argparse
+import datetime
+import threading
+from collections import deque
+
+import crpstream
+import digicueblue
+
+MAGIC = b"DIGICUE1"
+METRICS = [metric for label, metric in digicueblue.DigicueBlue.config_metrics]
+# MAC address, POSIX time, 8 scores, impact x/y, steering direction,
+# ALERT0, ALERT1, ACONF0-3 (255 when not reported)
+SHOT = struct.Struct("<6sd8f2fc6B")
+
+
+def shot_tuple(dcb):
+    return ((dcb.macaddr, dcb.timestamp) +
+            tuple(getattr(dcb, "score_" + metric) for metric in METRICS) +
+            (dcb.impactx, dcb.impacty, dcb.score_steering_direction,
+             dcb.ALERT0, dcb.ALERT1, dcb.ACONF0, dcb.ACONF1, dcb.ACONF2, dcb.ACONF3))
+
+
+def encode_ndjson(shot):
+    macaddr, timestamp = shot[:2]
+    record = {"mac": macaddr, "time": timestamp.isoformat()}
+    for metric, score in zip(METRICS, shot[2:10]):
+        record[metric] = score
+    (record["impactx"], record["impacty"], record["steering_direction"],
+     record["alert0"], record["alert1"], aconf0, aconf1, aconf2, aconf3) = shot[10:]
+    record["aconf"] = [aconf0, aconf1, aconf2, aconf3]
+    return json.dumps(record, separators=(",", ":")).encode() + b"\n"
+
+
+def encode_binary(shot):
+    macaddr, timestamp = shot[:2]
+    flags = [255 if value is None else value for value in shot[13:]]
+    record = SHOT.pack(bytes.fromhex(macaddr), timestamp.timestamp(), *shot[2:12],
+                       (shot[12] or "C").encode(), *flags)
+    return struct.pack("<H", len(record)) + record
+
+
+def decode_binary(record):
+    values = SHOT.unpack(record)
+    shot = {"mac": values[0].hex().upper(),
+            "time": datetime.datetime.fromtimestamp(values[1]).isoformat()}
+    for metric, score in zip(METRICS, values[2:10]):
+        shot[metric] = score
+    shot["impactx"], shot["impacty"] = values[10:12]
+    shot["steering_direction"] = values[12].decode()
+    flags = [None if value == 255 else value for value in values[13:]]
+    shot["alert0"], shot["alert1"] = flags[:2]
+    shot["aconf"] = flags[2:]
+    return shot
+
+
+ENCODERS = {"ndjson": encode_ndjson, "binary": encode_binary}
+
+
+class Subscriber():
+
+    # one connected client, served by its own sender thread
+
+    def __init__(self, connection, backlog, number=0):
+        self.connection = connection
+        self.number = number
+        self.queue = deque(maxlen=backlog)
+        self.ready = threading.Condition()
+        self.dropped = 0
+        self.closed = False
+
+    def put(self, data):
+        with self.ready:
+            if len(self.queue) == self.queue.maxlen:
+                self.dropped += 1  # deque drops the oldest
+            self.queue.append(data)
+            self.ready.notify()
+
+    def send(self, header):
+        try:
+            self.connection.sendall(header)
+            while not self.closed:
+                with self.ready:
+                    while not self.queue and not self.closed:
+                        self.ready.wait()
+                    # everything queued goes out in one write
+                    data = b"".join(self.queue)
+                    self.queue.clear()
+                if data:
+                    self.connection.sendall(data)
+        except OSError:
+            pass
+        self.close()
+
+    def close(self):
+        with self.ready:
+            if self.closed:
+                return
+            self.closed = True
+            self.ready.notify()
+        try:
+            self.connection.close()
+        except OSError:
+            pass
+        if self.dropped:
+            print("Subscriber %d fell behind, %d shots dropped" % (self.number, self.dropped))
+
+
+class ShotPublisher():
+
+    def __init__(self, path="digicue.sock", encoding="ndjson", backlog=256):
+        if not hasattr(socket, "AF_UNIX"):
+            raise OSError("Unix domain sockets are not available on this platform")
+        self.path = path
+        self.encoding = encoding
+        self.encode = ENCODERS[encoding]
+        self.backlog = backlog
+        self.pending = deque()
+        self.ready = threading.Event()
+        self.subscribers = []
+        self.lock = threading.Lock()
+        self.server = None
+        self.published = 0
+        self.accepted = 0
+
+    def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # left over from an earlier run
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(self.path)
+        self.server.listen(16)
+        threading.Thread(target=self.accept, daemon=True).start()
+        threading.Thread(target=self.fan_out, daemon=True).start()
+
+    def add_shot(self, dcb):
+        # shot listener, O(1) in the decoder thread
+        self.pending.append(shot_tuple(dcb))
+        self.ready.set()
+
+    def accept(self):
+        header = MAGIC + b" " + self.encoding.encode() + b"\n"
+        while True:
+            try:
+                connection, address = self.server.accept()
+            except OSError:
+                return  # closed
+            self.accepted += 1
+            subscriber = Subscriber(connection, self.backlog, self.accepted)
+            with self.lock:
+                self.subscribers.append(subscriber)
+            threading.Thread(target=subscriber.send, args=(header,), daemon=True).start()
+
+    def fan_out(self):
+        while True:
+            self.ready.wait()
+            self.ready.clear()
+            while self.pending:
+                data = self.encode(self.pending.popleft())
+                self.published += 1
+                with self.lock:
+                    self.subscribers = [s for s in self.subscribers if not s.closed]
+                    subscribers = list(self.subscribers)
+                for subscriber in subscribers:
+                    subscriber.put(data)
+
+    def close(self):
+        if self.server is not None:
+            try:
+                self.server.shutdown(socket.SHUT_RDWR)  # wakes up accept()
+            except OSError:
+                pass
+            self.server.close()
+            self.server = None
+        with self.lock:
+            for subscriber in self.subscribers:
+                subscriber.close()
+            self.subscribers = []
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+def subscribe(path="digicue.sock"):
+    """Yield every shot published on path as a dict"""
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    connection.connect(path)
+    shots = deque()
+    stream = None
+    header = b""
+    try:
+        while True:
+            data = connection.recv(65536)
+            if not data:
+                return
+            if stream is None:
+                header += data
+                if b"\n" not in header:
+                    continue
+                line, data = header.split(b"\n", 1)
+                magic, encoding = line.split(b" ", 1)
+                if magic != MAGIC:
+                    raise ValueError("Not a DigiCue shot stream: %r" % line)
+                if encoding == b"binary":
+                    stream = crpstream.StreamBuffer(
+                        lambda record: shots.append(decode_binary(record)),
+                        crpstream.LengthPrefixFraming(2))
+                else:
+                    stream = crpstream.StreamBuffer(
+                        lambda line: shots.append(json.loads(line)),
+                        crpstream.DelimitedFraming(b"\n"))
+            stream.feed(data)
+            while shots:
+                yield shots.popleft()
+    finally:
+        connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Print the live shots published by headless.py --publish')
+    parser.add_argument('-s', '--socket', default='digicue.sock', help='socket path (default: digicue.sock)')
+    args = parser.parse_args()
+
+    if not hasattr(socket, "AF_UNIX"):
+        print("Unix domain sockets are not available on this platform")
+        return 1
+    try:
+        for shot in subscribe(args.socket):
+            print(json.dumps(shot))
+            sys.stdout.flush()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    sys.exit(main())
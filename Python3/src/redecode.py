@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Parallel capture re-decode
+Re-decodes archives of raw captures through BGLib and DigicueBlue across
+all CPU cores and merges the decoded shots into the shot store (data.csv
+format) in time order.
+
+Hex logs are decoded one file per task. Binary captures are additionally
+split into byte ranges that start on a BGAPI frame boundary, so a single
+large capture also spreads across the workers. The store is rewritten to
+a temporary file and replaced, so it stays sorted by time, and shots it
+already holds are not added twice.
+"""
+
+import os
+import time
+import heapq
+import datetime
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import capture
+import replay
+import digicueblue
+
+
+def frame_boundaries(path):
+    """Yield (offset, length) of every binary capture record and whether the
+    BGAPI stream is between frames at the start of that record"""
+    need = 0
+    header = []
+    offset = 0
+    for t, data in capture.read_binary(path):
+        yield offset, need == 0 and not header
+        offset += capture.RECORD.size + len(data)
+        i = 0
+        n = len(data)
+        while i < n:
+            if need > 0:
+                take = min(need, n - i)
+                need -= take
+                i += take
+                continue
+            b = data[i]
+            i += 1
+            if not header and b not in (0x00, 0x80, 0x08, 0x88):
+                continue  # garbage between frames, BGLib skips it too
+            header.append(b)
+            if len(header) == 2:
+                # class id, command id and payload follow
+                need = 2 + (((header[0] & 0x07) << 8) | header[1])
+                header = []
+
+
+def split(path, shards):
+    """Split a binary capture into about `shards` byte ranges on frame boundaries"""
+    size = os.path.getsize(path)
+    if shards < 2 or size == 0:
+        return [(0, None)]
+    starts = [0]
+    for offset, idle in frame_boundaries(path):
+        if idle and offset >= size * len(starts) / shards:
+            starts.append(offset)
+            if len(starts) == shards:
+                break
+    return [(a, b) for a, b in zip(starts, starts[1:] + [None])]
+
+
+def decode(path, start=0, end=None, date=None):
+    """Worker: decode one file or byte range, return shots in time order"""
+    shots = []
+
+    def on_shot(dcb):
+        shots.append((dcb.timestamp, dcb.macaddr, dcb.packet_count, dcb.csv_row()))
+
+    rp = replay.Replay()
+    rp.dcb.shot_listeners.append(on_shot)
+    if capture.is_hex_log(path):
+        records = capture.read_hex_log(path, date)
+    else:
+        records = capture.read_binary(path, start, end)
+    for t, chunk in records:
+        rp.feed(t, chunk)
+    shots.sort(key=lambda shot: shot[0])
+    return shots
+
+
+def merge(results):
+    """Merge per task shot lists in time order, dropping repeats of the same
+    packet that were decoded on both sides of a shard boundary"""
+    last = {}
+    for timestamp, macaddr, packet_count, row in heapq.merge(*results, key=lambda shot: shot[0]):
+        if last.get(macaddr) == packet_count:
+            continue
+        last[macaddr] = packet_count
+        yield timestamp, row, True
+
+
+def stored(path):
+    """Yield the shots of an existing shot store like merge()"""
+    with open(path, "r") as f:
+        for line in f:
+            if line.startswith("Date,"):  # header
+                continue
+            if not line.endswith("\n"):
+                line += "\n"
+            yield datetime.datetime.fromisoformat(line.split(',', 1)[0]), line, False
+
+
+def write_store(path, rows):
+    """Write the time ordered rows to path in place, return the number of
+    new shots written"""
+    count = 0
+    last = None
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        f.write(digicueblue.DigicueBlue.csv_header)
+        for timestamp, row, new in rows:
+            if row == last:
+                continue  # shot already in the store
+            last = row
+            f.write(row)
+            count += new
+    os.replace(tmp, path)
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Re-decode capture archives across CPU cores')
+    parser.add_argument('captures', nargs='+', help='hex log (capture.txt) or binary capture files')
+    parser.add_argument('-o', '--output', default='data.csv', help='shot store to merge into (default: data.csv)')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='worker processes (default: all cores)')
+    parser.add_argument('-d', '--date', help='date of hex log captures, YYYY-MM-DD (default: file date)')
+    args = parser.parse_args()
+
+    date = None
+    if args.date:
+        date = datetime.datetime.strptime(args.date, "%Y-%m-%d").date()
+
+    start = time.perf_counter()
+    tasks = []
+    size = 0
+    for path in args.captures:
+        size += os.path.getsize(path)
+        if capture.is_hex_log(path):
+            tasks.append((path, 0, None))
+        else:
+            # a few ranges per worker keeps the pool busy until the end
+            for a, b in split(path, args.jobs * 4):
+                tasks.append((path, a, b))
+
+    with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        futures = [executor.submit(decode, path, a, b, date) for path, a, b in tasks]
+        results = [future.result() for future in futures]
+
+    rows = merge(results)
+    if os.path.isfile(args.output):
+        rows = heapq.merge(stored(args.output), rows, key=lambda shot: shot[0])
+    count = write_store(args.output, rows)
+
+    elapsed = time.perf_counter() - start
+    print("Tasks:   %d on %d workers" % (len(tasks), args.jobs))
+    print("Shots:   %d new" % count)
+    print("Elapsed: %.3f s" % elapsed)
+    if elapsed > 0:
+        print("Rate:    %.0f shots/s, %.2f MB/s" % (count / elapsed, size / elapsed / 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Capture replay
+Feeds recorded BLED112 traffic through BGLib and DigicueBlue, either as
+fast as possible or at N x real time using the recorded timestamps, and
+reports frames per second, shots decoded and the time spent in each stage.
+This is the regression benchmark for parser and decoder changes.
+"""
+
+import time
+import datetime
+import argparse
+
+import bglib
+import capture
+import digicueblue
+
+
+class Replay():
+
+    def __init__(self, speed=0, filename=None):
+        self.speed = speed  # 0 = as fast as possible, otherwise N x real time
+        self.dcb = digicueblue.DigicueBlueGroup(filename=filename)
+        self.dcb.shot_listeners.append(self.on_shot)
+
+        self.ble = bglib.BGLib()
+        self.ble.packet_mode = False
+        self.ble.debug = False
+        self.ble.ble_evt_gap_scan_response += self.on_scan_response
+
+        self.timestamp = None
+        self.first_time = None
+        self.first_wall = None
+
+        self.bytes = 0
+        self.frames = 0
+        self.scan_responses = 0
+        self.shots = 0
+        self.read_time = 0.0
+        self.parse_time = 0.0
+        self.decode_time = 0.0
+        self.wall_time = 0.0
+
+    def on_shot(self, dcb):
+        self.shots += 1
+
+    def on_scan_response(self, sender, args):
+        t0 = time.perf_counter()
+        self.dcb.receive(args['sender'], args['data'], self.timestamp)
+        self.decode_time += time.perf_counter() - t0
+        self.scan_responses += 1
+
+    def wait(self, t):
+        if self.first_time is None:
+            self.first_time = t
+            self.first_wall = time.perf_counter()
+            return
+        delay = self.first_wall + (t - self.first_time) / self.speed - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+    def feed(self, t, chunk):
+        if self.speed > 0:
+            self.wait(t)
+        self.timestamp = datetime.datetime.fromtimestamp(t)
+        ble = self.ble
+        pending = len(ble.bgapi_rx_buffer) > 0
+        frames = 0
+        t0 = time.perf_counter()
+        for i in range(len(chunk)):
+            ble.parse(chunk[i:i + 1])
+            if pending and not ble.bgapi_rx_buffer:
+                frames += 1
+            pending = len(ble.bgapi_rx_buffer) > 0
+        self.parse_time += time.perf_counter() - t0
+        self.frames += frames
+        self.bytes += len(chunk)
+
+    def run(self, path, date=None):
+        records = iter(capture.read_capture(path, date))
+        start = time.perf_counter()
+        while True:
+            t0 = time.perf_counter()
+            try:
+                t, chunk = next(records)
+            except StopIteration:
+                break
+            self.read_time += time.perf_counter() - t0
+            self.feed(t, chunk)
+        self.wall_time += time.perf_counter() - start
+
+    def report(self):
+        # parse time includes the decoder called from the BGLib event
+        parse = self.parse_time - self.decode_time
+        busy = self.read_time + self.parse_time
+        print("Bytes:          %d" % self.bytes)
+        print("Frames:         %d" % self.frames)
+        print("Scan responses: %d" % self.scan_responses)
+        print("Devices:        %d" % len(self.dcb.devices))
+        print("Shots decoded:  %d" % self.shots)
+        print("Read:           %8.3f ms" % (self.read_time * 1000))
+        print("Parse:          %8.3f ms" % (parse * 1000))
+        print("Decode:         %8.3f ms" % (self.decode_time * 1000))
+        print("Wall:           %8.3f ms" % (self.wall_time * 1000))
+        if busy > 0:
+            print("Frames/s:       %.0f" % (self.frames / busy))
+            print("Bytes/s:        %.0f" % (self.bytes / busy))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay BLED112 captures through BGLib and DigicueBlue')
+    parser.add_argument('captures', nargs='+', help='hex log (capture.txt) or binary capture files')
+    parser.add_argument('-s', '--speed', type=float, default=0,
+                        help='replay at N x real time (default: as fast as possible)')
+    parser.add_argument('-o', '--output', help='append decoded shots to this csv file')
+    parser.add_argument('-d', '--date', help='date of hex log captures, YYYY-MM-DD (default: file date)')
+    parser.add_argument('-n', '--repeat', type=int, default=1, help='replay the captures N times')
+    args = parser.parse_args()
+
+    date = None
+    if args.date:
+        date = datetime.datetime.strptime(args.date, "%Y-%m-%d").date()
+
+    replay = Replay(speed=args.speed, filename=args.output)
+    for i in range(args.repeat):
+        # start each pass with fresh packet counters
+        replay.dcb.devices.clear()
+        for path in args.captures:
+            replay.first_time = None
+            replay.run(path, date)
+    replay.report()
+
+
+if __name__ == '__main__':
+    main()
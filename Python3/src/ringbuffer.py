@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Rolling-window shot aggregates
+Fixed-capacity ring buffers backed by array.array with O(1) push and O(1)
+sum and mean over the last N values, plus a time window ("last hour")
+that evicts values as they age out. Buffers are preallocated, so pushing
+a shot allocates no containers.
+
+RollingShots.add_shot is a DigicueBlue shot listener keeping one buffer
+per device and metric.
+"""
+
+from array import array
+
+import digicueblue
+
+METRICS = [metric for label, metric in digicueblue.DigicueBlue.config_metrics]
+
+
+class RingBuffer():
+
+    def __init__(self, capacity=50, windows=(10, 50)):
+        self.capacity = max(capacity, max(windows))
+        self.windows = windows
+        self.values = array('d', [0.0]) * self.capacity
+        self.sums = array('d', [0.0]) * len(windows)
+        self.head = 0  # next slot to write
+        self.count = 0
+
+    def push(self, x):
+        values = self.values
+        for i in range(len(self.windows)):
+            w = self.windows[i]
+            self.sums[i] += x
+            if self.count >= w:
+                # value leaving this window
+                self.sums[i] -= values[(self.head - w) % self.capacity]
+        values[self.head] = x
+        self.head += 1
+        if self.count < self.capacity:
+            self.count += 1
+        if self.head == self.capacity:
+            self.head = 0
+            self.resum()
+
+    def resum(self):
+        # recompute the running sums once per lap so rounding can't build up
+        for i in range(len(self.windows)):
+            total = 0.0
+            for j in range(1, min(self.windows[i], self.count) + 1):
+                total += self.values[(self.head - j) % self.capacity]
+            self.sums[i] = total
+
+    def sum(self, window):
+        return self.sums[self.windows.index(window)]
+
+    def mean(self, window):
+        n = min(window, self.count)
+        if n == 0:
+            return None
+        return self.sum(window) / n
+
+    def last(self):
+        if self.count == 0:
+            return None
+        return self.values[(self.head - 1) % self.capacity]
+
+
+class TimeWindow():
+
+    def __init__(self, span=3600.0, capacity=2048):
+        self.span = span  # seconds
+        self.capacity = capacity
+        self.times = array('d', [0.0]) * capacity
+        self.values = array('d', [0.0]) * capacity
+        self.head = 0  # oldest value
+        self.count = 0
+        self.total = 0.0
+
+    def evict(self, now):
+        oldest = now - self.span
+        while self.count and self.times[self.head] < oldest:
+            self.drop()
+
+    def drop(self):
+        self.total -= self.values[self.head]
+        self.head = (self.head + 1) % self.capacity
+        self.count -= 1
+        if self.count == 0:
+            self.total = 0.0
+
+    def push(self, t, x):
+        self.evict(t)
+        if self.count == self.capacity:
+            self.drop()
+        tail = (self.head + self.count) % self.capacity
+        self.times[tail] = t
+        self.values[tail] = x
+        self.count += 1
+        self.total += x
+
+    def sum(self, now=None):
+        if now is not None:
+            self.evict(now)
+        return self.total
+
+    def mean(self, now=None):
+        if now is not None:
+            self.evict(now)
+        if self.count == 0:
+            return None
+        return self.total / self.count
+
+
+class RollingShots():
+
+    def __init__(self, windows=(10, 50), span=3600.0):
+        self.windows = windows
+        self.span = span
+        self.devices = {}
+
+    def device(self, macaddr):
+        buffers = self.devices.get(macaddr)
+        if buffers is None:
+            buffers = dict((metric, (RingBuffer(max(self.windows), self.windows), TimeWindow(self.span)))
+                           for metric in METRICS)
+            self.devices[macaddr] = buffers
+        return buffers
+
+    def add_shot(self, dcb):
+        t = dcb.timestamp.timestamp()
+        buffers = self.device(dcb.macaddr)
+        for metric in METRICS:
+            x = getattr(dcb, "score_" + metric)
+            ring, timed = buffers[metric]
+            ring.push(x)
+            timed.push(t, x)
+
+    def means(self, macaddr, metric, now=None):
+        """(mean of each window..., mean over the time span) or None"""
+        buffers = self.devices.get(macaddr)
+        if buffers is None:
+            return None
+        ring, timed = buffers[metric]
+        return tuple(ring.mean(w) for w in self.windows) + (timed.mean(now),)
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Daily and weekly shot rollups
+Materialized per device per day and per week tables holding the shot
+count, the sum and sum of squares of every metric and the fault count of
+every ALERT0 bit. Rollups.add_shot is a DigicueBlue shot listener that
+updates both tables on every persisted shot; rebuild() recreates them from
+data.csv in bulk. Trend charts read a few hundred rollup rows instead of
+every stored shot.
+
+A shot only appends the new state of its day and week row to the files.
+When a period appears more than once the last row wins, and load()
+rewrites the file with one row per period.
+"""
+
+import os
+import datetime
+import argparse
+
+import digicueblue
+
+METRICS = [metric for label, metric in digicueblue.DigicueBlue.config_metrics]
+
+
+class RollupTable():
+
+    def __init__(self, filename, period):
+        self.filename = filename
+        self.period = period  # "daily" or "weekly"
+        self.rows = {}  # (macaddr, date) -> [count, sums, sums of squares, faults]
+        self.load()
+
+    def key(self, macaddr, timestamp):
+        date = timestamp.date()
+        if self.period == "weekly":
+            date -= datetime.timedelta(days=date.weekday())  # weeks start on Monday
+        return macaddr, date
+
+    def header(self):
+        columns = ["MAC", "Period", "Count"]
+        columns += ["Sum_%s" % metric for metric in METRICS]
+        columns += ["SumSq_%s" % metric for metric in METRICS]
+        columns += ["Faults_%s" % metric for metric in METRICS]
+        return ",".join(columns) + "\n"
+
+    def load(self):
+        if self.filename is None or not os.path.isfile(self.filename):
+            return
+        n = len(METRICS)
+        lines = 0
+        with open(self.filename, "r") as f:
+            f.readline()  # header
+            for line in f:
+                lines += 1
+                parse = line.rstrip().split(',')
+                try:
+                    date = datetime.datetime.strptime(parse[1], "%Y-%m-%d").date()
+                    values = [float(x) for x in parse[3:]]
+                    if len(values) != 3 * n:
+                        continue  # row cut short by a crash
+                    self.rows[(parse[0], date)] = [
+                        int(parse[2]),
+                        values[0:n],
+                        values[n:2 * n],
+                        [int(x) for x in values[2 * n:3 * n]]]
+                except (ValueError, IndexError):
+                    continue
+        if lines > len(self.rows):
+            self.save()  # drop the superseded rows
+
+    def save(self):
+        if self.filename is None:
+            return
+        tmp = self.filename + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(self.header())
+            for key, row in sorted(self.rows.items()):
+                f.write(self.row_text(key, row))
+        os.replace(tmp, self.filename)
+
+    def row_text(self, key, row):
+        macaddr, date = key
+        count, sums, sumsqs, faults = row
+        textstr = "%s,%s,%i" % (macaddr, date.isoformat(), count)
+        textstr += "".join(",%r" % x for x in sums)
+        textstr += "".join(",%r" % x for x in sumsqs)
+        textstr += "".join(",%i" % x for x in faults)
+        return textstr + "\n"
+
+    def append(self, key):
+        # persist one changed row without rewriting the table
+        if self.filename is None:
+            return
+        exists = os.path.isfile(self.filename)
+        with open(self.filename, "a") as f:
+            if not exists:
+                f.write(self.header())
+            f.write(self.row_text(key, self.rows[key]))
+
+    def add_shot(self, dcb):
+        key = self.key(dcb.macaddr, dcb.timestamp)
+        row = self.rows.get(key)
+        if row is None:
+            n = len(METRICS)
+            row = [0, [0.0] * n, [0.0] * n, [0] * n]
+            self.rows[key] = row
+        row[0] += 1
+        sums, sumsqs, faults = row[1], row[2], row[3]
+        alert0 = dcb.ALERT0
+        for i, metric in enumerate(METRICS):
+            x = getattr(dcb, "score_" + metric)
+            sums[i] += x
+            sumsqs[i] += x * x
+            if alert0 is not None and (alert0 >> i) & 1:
+                faults[i] += 1
+        return key
+
+    def trend(self, macaddr, metric, start=None, end=None):
+        """[(date, count, mean, std, fault rate)] of one metric, oldest first"""
+        i = METRICS.index(metric)
+        points = []
+        for (mac, date), (count, sums, sumsqs, faults) in sorted(self.rows.items()):
+            if mac != macaddr or (start is not None and date < start) or (end is not None and date > end):
+                continue
+            mean = sums[i] / count
+            variance = max(sumsqs[i] / count - mean * mean, 0.0)
+            points.append((date, count, mean, variance ** 0.5, faults[i] / float(count)))
+        return points
+
+
+class Rollups():
+
+    def __init__(self, daily="rollup_daily.csv", weekly="rollup_weekly.csv"):
+        self.daily = RollupTable(daily, "daily")
+        self.weekly = RollupTable(weekly, "weekly")
+
+    def add_shot(self, dcb):
+        self.daily.append(self.daily.add_shot(dcb))
+        self.weekly.append(self.weekly.add_shot(dcb))
+
+    def rebuild(self, filename):
+        """Recreate both tables from every shot stored in filename"""
+        self.daily.rows = {}
+        self.weekly.rows = {}
+        for shot in digicueblue.read_shots(filename):
+            self.daily.add_shot(shot)
+            self.weekly.add_shot(shot)
+        self.daily.save()
+        self.weekly.save()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Daily and weekly shot rollups')
+    parser.add_argument('-r', '--rebuild', metavar='CSV', help='rebuild the rollups from a shot store, e.g. data.csv')
+    parser.add_argument('-m', '--mac', help='print the trend of this MAC address')
+    parser.add_argument('-t', '--metric', default='jab', choices=METRICS, help='metric to print (default: jab)')
+    parser.add_argument('-w', '--weekly', action='store_true', help='print weekly instead of daily rollups')
+    args = parser.parse_args()
+
+    rollups = Rollups()
+    if args.rebuild:
+        rollups.rebuild(args.rebuild)
+        print("Rebuilt %d daily and %d weekly rows" % (len(rollups.daily.rows), len(rollups.weekly.rows)))
+    if args.mac:
+        table = rollups.weekly if args.weekly else rollups.daily
+        for date, count, mean, std, fault_rate in table.trend(args.mac, args.metric):
+            print("%s  %5d shots  %s %6.2f +/- %5.2f  faults %5.1f%%" % (
+                date.isoformat(), count, args.metric, mean, std, 100 * fault_rate))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Practice session rollups
+Splits the shot stream of every cue into sessions at idle gaps and keeps
+per-session aggregates (shot count, mean, spread and quartiles per metric,
+fault rates) up to date as shots arrive.
+
+Closed sessions are appended to sessions.jsonl, one JSON object per line;
+the sessions still open are saved to sessions_open.json after every shot
+so they survive a restart. "Last N sessions" views read those files only,
+never the raw shots.
+"""
+
+import os
+import json
+import datetime
+import argparse
+from collections import deque
+
+import stats
+import digicueblue
+
+QUANTILES = (0.25, 0.5, 0.75)
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+
+class Session():
+
+    def __init__(self, macaddr, start):
+        self.macaddr = macaddr
+        self.start = start
+        self.end = start
+        self.shots = 0
+        self.stats = dict((metric, stats.RunningStats(QUANTILES)) for metric in stats.ShotStats.metrics)
+        self.faults = dict((metric, 0) for metric in stats.ShotStats.metrics)
+
+    def add_shot(self, dcb):
+        self.end = dcb.timestamp
+        self.shots += 1
+        for bit, (label, metric) in enumerate(digicueblue.DigicueBlue.config_metrics):
+            self.stats[metric].add(getattr(dcb, "score_" + metric))
+            if dcb.ALERT0 is not None and (dcb.ALERT0 >> bit) & 1:
+                self.faults[metric] += 1
+
+    def rollup(self):
+        metrics = {}
+        for metric, s in self.stats.items():
+            metrics[metric] = {
+                "mean": s.mean,
+                "std": s.std(),
+                "min": s.min,
+                "max": s.max,
+                "p25": s.quantile(0.25),
+                "p50": s.quantile(0.5),
+                "p75": s.quantile(0.75),
+                "faults": self.faults[metric],
+                "fault_rate": self.faults[metric] / float(self.shots) if self.shots else 0.0,
+            }
+        return {
+            "mac": self.macaddr,
+            "start": self.start.strftime(DATE_FORMAT),
+            "end": self.end.strftime(DATE_FORMAT),
+            "shots": self.shots,
+            "metrics": metrics,
+        }
+
+    def state(self):
+        return {
+            "mac": self.macaddr,
+            "start": self.start.strftime(DATE_FORMAT),
+            "end": self.end.strftime(DATE_FORMAT),
+            "shots": self.shots,
+            "stats": dict((metric, s.state()) for metric, s in self.stats.items()),
+            "faults": self.faults,
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        self = cls(state["mac"], datetime.datetime.strptime(state["start"], DATE_FORMAT))
+        self.end = datetime.datetime.strptime(state["end"], DATE_FORMAT)
+        self.shots = state["shots"]
+        self.stats = dict((metric, stats.RunningStats.from_state(s)) for metric, s in state["stats"].items())
+        self.faults = state["faults"]
+        return self
+
+
+class Sessionizer():
+
+    def __init__(self, filename="sessions.jsonl", gap=600):
+        self.filename = filename
+        self.open_filename = None
+        if filename is not None:
+            self.open_filename = os.path.splitext(filename)[0] + "_open.json"
+        self.gap = datetime.timedelta(seconds=gap)  # idle time that ends a session
+        self.sessions = {}
+        self.load()
+
+    def load(self):
+        if self.open_filename is None or not os.path.isfile(self.open_filename):
+            return
+        with open(self.open_filename, "r") as f:
+            for state in json.load(f):
+                session = Session.from_state(state)
+                self.sessions[session.macaddr] = session
+
+    def save(self):
+        if self.open_filename is None:
+            return
+        tmp = self.open_filename + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump([session.state() for session in self.sessions.values()], f)
+        os.replace(tmp, self.open_filename)
+
+    def close(self, session):
+        if self.filename is None:
+            return
+        with open(self.filename, "a") as f:
+            f.write(json.dumps(session.rollup()) + "\n")
+
+    def add_shot(self, dcb):
+        session = self.sessions.get(dcb.macaddr)
+        if session is not None and dcb.timestamp - session.end > self.gap:
+            self.close(session)
+            session = None
+        if session is None:
+            session = Session(dcb.macaddr, dcb.timestamp)
+            self.sessions[dcb.macaddr] = session
+        session.add_shot(dcb)
+        self.save()
+
+    def flush(self):
+        # close every open session, e.g. before a bulk rebuild
+        for session in self.sessions.values():
+            self.close(session)
+        self.sessions = {}
+        self.save()
+
+    def last(self, count=50, macaddr=None):
+        """Rollups of the last `count` sessions, newest last, including open ones"""
+        rollups = deque(maxlen=count)
+        if self.filename is not None and os.path.isfile(self.filename):
+            with open(self.filename, "r") as f:
+                for line in f:
+                    if macaddr is not None and ('"mac": "%s"' % macaddr) not in line:
+                        continue
+                    rollups.append(line)
+        rollups = deque((json.loads(line) for line in rollups), maxlen=count)
+        for session in sorted(self.sessions.values(), key=lambda s: s.start):
+            if macaddr is None or session.macaddr == macaddr:
+                rollups.append(session.rollup())
+        return list(rollups)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Show the last practice sessions')
+    parser.add_argument('-f', '--file', default='sessions.jsonl', help='session rollups (default: sessions.jsonl)')
+    parser.add_argument('-n', '--count', type=int, default=50, help='number of sessions (default: 50)')
+    parser.add_argument('-m', '--mac', help='only sessions of this MAC address')
+    args = parser.parse_args()
+
+    sessionizer = Sessionizer(args.file)
+    for rollup in sessionizer.last(args.count, args.mac):
+        metrics = rollup["metrics"]
+        worst = max(metrics, key=lambda metric: metrics[metric]["fault_rate"])
+        print("%s  %s - %s  %4d shots  jab %.1f  straightness %.1f  most faults: %s %.0f%%" % (
+            rollup["mac"], rollup["start"][:16], rollup["end"][11:16], rollup["shots"],
+            metrics["jab"]["mean"], metrics["straightness"]["mean"],
+            worst, 100 * metrics[worst]["fault_rate"]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Nearest-neighbour shot search
+A k-d tree over the metric vector of every stored shot (jab, follow
+through, tip steer, straightness, finesse, finish, backstroke pause and
+impact x/y), each scaled to its full range. Answers "show me my past shots
+most like this one" in milliseconds instead of a scan over all shots.
+
+Points live in one flat array.array; the tree stores row numbers in
+leaf buckets that split when they overflow, so shots can be inserted
+one at a time as they arrive (ShotIndex.add_shot is a shot listener).
+"""
+
+import math
+import time
+import heapq
+import argparse
+from array import array
+
+import digicueblue
+
+# (attribute, full scale) of each vector dimension
+DIMENSIONS = (
+    ("score_jab", 10.0),
+    ("score_followthru", 10.0),
+    ("score_steering", 10.0),
+    ("score_straightness", 10.0),
+    ("score_power", 10.0),
+    ("score_freeze", 3.5),
+    ("score_bspause", 1.0),
+    ("impactx", 50.0),
+    ("impacty", 50.0),
+)
+DIM = len(DIMENSIONS)
+LEAF_SIZE = 32
+
+
+def vector(shot):
+    return [getattr(shot, attr) / scale for attr, scale in DIMENSIONS]
+
+
+class ShotIndex():
+
+    def __init__(self):
+        self.data = array('d')
+        self.dates = []
+        self.root = [None, []]  # leaf: [None, rows]; node: [dim, split, low, high]
+
+    def __len__(self):
+        return len(self.dates)
+
+    def point(self, row):
+        return self.data[row * DIM:(row + 1) * DIM]
+
+    def build(self, rows):
+        # split on the dimension with the largest spread at its median
+        if len(rows) <= LEAF_SIZE:
+            return [None, rows]
+        data = self.data
+        dim = 0
+        spread = -1.0
+        for d in range(DIM):
+            column = [data[row * DIM + d] for row in rows[::max(1, len(rows) // 64)]]
+            if max(column) - min(column) > spread:
+                spread = max(column) - min(column)
+                dim = d
+        rows.sort(key=lambda row: data[row * DIM + dim])
+        # equal values must all land on the high side of the split
+        i = len(rows) // 2
+        split = data[rows[i] * DIM + dim]
+        while i > 0 and data[rows[i - 1] * DIM + dim] == split:
+            i -= 1
+        if i == 0:
+            while i < len(rows) and data[rows[i] * DIM + dim] == split:
+                i += 1
+            if i == len(rows):
+                return [None, rows]  # all values equal
+            split = data[rows[i] * DIM + dim]
+        return [dim, split, self.build(rows[:i]), self.build(rows[i:])]
+
+    def append(self, values, date):
+        row = len(self.dates)
+        self.data.extend(values)
+        self.dates.append(date)
+        return row
+
+    def insert(self, values, date):
+        row = self.append(values, date)
+        parent = None
+        node = self.root
+        while node[0] is not None:
+            parent = node
+            node = node[2] if values[node[0]] < node[1] else node[3]
+        node[1].append(row)
+        if len(node[1]) > 2 * LEAF_SIZE:
+            split = self.build(node[1])
+            if parent is None:
+                self.root = split
+            elif parent[2] is node:
+                parent[2] = split
+            else:
+                parent[3] = split
+        return row
+
+    def add_shot(self, dcb):
+        self.insert(vector(dcb), dcb.timestamp)
+
+    def load(self, shots):
+        # bulk load, then build a balanced tree once
+        for shot in shots:
+            self.append(vector(shot), shot.timestamp)
+        self.root = self.build(list(range(len(self.dates))))
+
+    def nearest(self, values, k=10):
+        """[(distance, row)] of the k shots closest to values, closest first"""
+        best = []  # max-heap of (-distance, row)
+        data = self.data
+        # each entry carries the squared distance from values to the cell
+        # and the per dimension offsets that make up that distance
+        stack = [(self.root, 0.0, [0.0] * DIM)]
+        while stack:
+            node, cell, offsets = stack.pop()
+            if len(best) == k and cell >= best[0][0] * best[0][0]:
+                continue
+            if node[0] is None:
+                for row in node[1]:
+                    d = math.dist(values, data[row * DIM:(row + 1) * DIM])
+                    if len(best) < k:
+                        heapq.heappush(best, (-d, row))
+                    elif d < -best[0][0]:
+                        heapq.heapreplace(best, (-d, row))
+                continue
+            dim, split, low, high = node
+            diff = values[dim] - split
+            near, far = (low, high) if diff < 0 else (high, low)
+            far_offsets = list(offsets)
+            far_offsets[dim] = diff
+            far_cell = cell - offsets[dim] * offsets[dim] + diff * diff
+            # visit the far side only if it can hold something closer
+            if len(best) < k or far_cell < best[0][0] * best[0][0]:
+                stack.append((far, far_cell, far_offsets))
+            stack.append((near, cell, offsets))
+        return sorted((-d, row) for d, row in best)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Find the stored shots most like a given shot')
+    parser.add_argument('-f', '--file', default='data.csv', help='shot store (default: data.csv)')
+    parser.add_argument('-r', '--row', type=int, default=-1, help='shot to match, by row (default: the last shot)')
+    parser.add_argument('-k', type=int, default=10, help='number of shots to show (default: 10)')
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    shots = list(digicueblue.read_shots(args.file))
+    t1 = time.perf_counter()
+    index = ShotIndex()
+    index.load(shots)
+    t2 = time.perf_counter()
+    target = vector(shots[args.row])
+    result = index.nearest(target, args.k + 1)
+    t3 = time.perf_counter()
+
+    print("%-26s %8s %5s %5s %5s %5s %5s %5s %5s %6s %6s" % (
+        "Date", "Distance", "Jab", "FT", "Steer", "Str", "Fin", "Fsh", "BP", "X", "Y"))
+    for distance, row in result:
+        shot = shots[row]
+        print("%-26s %8.3f %5.1f %5.1f %5.1f %5.1f %5.1f %5.2f %5.2f %6.1f %6.1f" % (
+            shot.timestamp, distance, shot.score_jab, shot.score_followthru, shot.score_steering,
+            shot.score_straightness, shot.score_power, shot.score_freeze, shot.score_bspause,
+            shot.impactx, shot.impacty))
+    print("%d shots: read %.0f ms, index %.0f ms, query %.2f ms" % (
+        len(shots), (t1 - t0) * 1000, (t2 - t1) * 1000, (t3 - t2) * 1000))
+
+
+if __name__ == '__main__':
+    main()
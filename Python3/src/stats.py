@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Streaming shot statistics
+Count, mean, variance, min/max, EWMA and approximate quantiles of every
+metric, per device, in constant memory. Quantiles use the P-square
+algorithm (Jain & Chlamtac, 1985) which keeps five markers per quantile.
+
+ShotStats.add_shot is a DigicueBlue shot listener; readers (GUI, API)
+query means and percentile bands without rescanning history.
+
+SummaryCache keeps the ShotStats of every persisted shot in summary.json,
+so the GUI can start with the averages and bands of all past sessions
+without reading data.csv.
+"""
+
+import os
+import json
+import bisect
+import argparse
+import traceback
+
+import digicueblue
+
+QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+
+
+class P2Quantile():
+
+    def __init__(self, p):
+        self.p = p
+        self.count = 0
+        self.heights = []
+        self.positions = [1, 2, 3, 4, 5]
+        self.desired = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]
+        self.increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, x):
+        self.count += 1
+        q = self.heights
+        if self.count <= 5:
+            bisect.insort(q, x)
+            return
+
+        n = self.positions
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = bisect.bisect_right(q, x) - 1
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        # adjust the three middle markers towards their desired positions
+        for i in (1, 2, 3):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                h = q[i] + d / float(n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / float(n[i + 1] - n[i]) +
+                    (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / float(n[i] - n[i - 1]))
+                if not q[i - 1] < h < q[i + 1]:
+                    h = q[i] + d * (q[i + d] - q[i]) / float(n[i + d] - n[i])
+                q[i] = h
+                n[i] += d
+
+    def value(self):
+        if self.count == 0:
+            return None
+        if self.count <= 5:
+            return self.heights[int(round(self.p * (self.count - 1)))]
+        return self.heights[2]
+
+    def state(self):
+        return [self.p, self.count, list(self.heights), list(self.positions), list(self.desired)]
+
+    @classmethod
+    def from_state(cls, state):
+        self = cls(state[0])
+        self.count = state[1]
+        self.heights = list(state[2])
+        self.positions = list(state[3])
+        self.desired = list(state[4])
+        return self
+
+
+class RunningStats():
+
+    def __init__(self, quantiles=QUANTILES, alpha=0.1):
+        self.alpha = alpha  # EWMA weight of the newest value
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+        self.ewma = None
+        self.quantiles = [P2Quantile(p) for p in quantiles]
+
+    def add(self, x):
+        # Welford's running mean and variance
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+        if self.count == 1:
+            self.min = self.max = self.ewma = x
+        else:
+            if x < self.min:
+                self.min = x
+            if x > self.max:
+                self.max = x
+            self.ewma += self.alpha * (x - self.ewma)
+        for q in self.quantiles:
+            q.add(x)
+
+    def variance(self):
+        if self.count < 2:
+            return 0.0
+        return self.m2 / (self.count - 1)
+
+    def std(self):
+        return self.variance() ** 0.5
+
+    def quantile(self, p):
+        for q in self.quantiles:
+            if q.p == p:
+                return q.value()
+        raise ValueError("Quantile %r is not tracked" % p)
+
+    def band(self, low=0.25, high=0.75):
+        return self.quantile(low), self.quantile(high)
+
+    def state(self):
+        return {
+            "alpha": self.alpha,
+            "count": self.count,
+            "mean": self.mean,
+            "m2": self.m2,
+            "min": self.min,
+            "max": self.max,
+            "ewma": self.ewma,
+            "quantiles": [q.state() for q in self.quantiles],
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        self = cls(quantiles=(), alpha=state["alpha"])
+        self.count = state["count"]
+        self.mean = state["mean"]
+        self.m2 = state["m2"]
+        self.min = state["min"]
+        self.max = state["max"]
+        self.ewma = state["ewma"]
+        self.quantiles = [P2Quantile.from_state(q) for q in state["quantiles"]]
+        return self
+
+
+class ShotStats():
+
+    metrics = [metric for label, metric in digicueblue.DigicueBlue.config_metrics]
+
+    def __init__(self, quantiles=QUANTILES, alpha=0.1):
+        self.quantiles = quantiles
+        self.alpha = alpha
+        self.devices = {}
+
+    def device(self, macaddr):
+        stats = self.devices.get(macaddr)
+        if stats is None:
+            stats = dict((metric, RunningStats(self.quantiles, self.alpha)) for metric in self.metrics)
+            self.devices[macaddr] = stats
+        return stats
+
+    def add_shot(self, dcb):
+        stats = self.device(dcb.macaddr)
+        for metric in self.metrics:
+            stats[metric].add(getattr(dcb, "score_" + metric))
+
+    def get(self, macaddr, metric):
+        stats = self.devices.get(macaddr)
+        if stats is None:
+            return None
+        return stats[metric]
+
+    def state(self):
+        return dict((macaddr, dict((metric, s.state()) for metric, s in stats.items()))
+                    for macaddr, stats in self.devices.items())
+
+    def load_state(self, state):
+        for macaddr, stats in state.items():
+            self.devices[macaddr] = dict((metric, RunningStats.from_state(s)) for metric, s in stats.items())
+
+
+def summary_filename(source):
+    # data.csv -> data.summary.json, next to the shot store
+    return os.path.splitext(source)[0] + ".summary.json"
+
+
+class SummaryCache():
+
+    # ShotStats of every shot in a shot store, saved after each shot. The
+    # size and modification time of the store are saved with it, so a
+    # store changed behind its back (redecode.py, an edit, another copy)
+    # makes the summary rebuild instead of showing stale numbers.
+
+    def __init__(self, filename=None, source=None):
+        # source is the shot store the summary is built from, e.g.
+        # data.csv; filename defaults to a name derived from it
+        if filename is None:
+            filename = summary_filename(source)
+        self.filename = filename
+        self.source = source
+        self.stats = ShotStats()
+        if not self.load() and source is not None and os.path.isfile(source):
+            print("Rebuilding %s from %s" % (filename, source))
+            self.rebuild(source)
+
+    def source_stamp(self):
+        if self.source is None or not os.path.isfile(self.source):
+            return None
+        st = os.stat(self.source)
+        return {"path": os.path.abspath(self.source), "size": st.st_size, "mtime": st.st_mtime_ns}
+
+    def load(self):
+        # False when the summary is missing, unreadable or out of date
+        try:
+            with open(self.filename, "r") as f:
+                summary = json.load(f)
+        except (IOError, OSError, ValueError):
+            return False
+        if "devices" not in summary:
+            return False  # written before the source was recorded
+        if self.source is not None and summary.get("source") != self.source_stamp():
+            return False
+        self.stats.load_state(summary["devices"])
+        return True
+
+    def save(self):
+        tmp = self.filename + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"source": self.source_stamp(), "devices": self.stats.state()}, f)
+        os.replace(tmp, self.filename)
+
+    def add_shot(self, dcb):
+        # the shot is already appended to the source, see DigicueBlue.receive
+        self.stats.add_shot(dcb)
+        self.save()
+
+    def rebuild(self, source):
+        self.source = source
+        self.stats = ShotStats()
+        for shot in digicueblue.read_shots(source):
+            self.stats.add_shot(shot)
+        self.save()
+
+
+def open_summary(source):
+    # SummaryCache of source, or None when it cannot be loaded or rebuilt,
+    # so a bad summary never keeps shots from being logged
+    try:
+        return SummaryCache(source=source)
+    except Exception:
+        print(traceback.format_exc())
+        print("Summary of %s unavailable, starting without it" % source)
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Summary of every stored shot per device')
+    parser.add_argument('-f', '--file', default='data.csv', help='shot store (default: data.csv)')
+    parser.add_argument('-s', '--summary', help='summary cache (default: data.summary.json for data.csv)')
+    parser.add_argument('-r', '--rebuild', action='store_true', help='rebuild the summary even if it is up to date')
+    args = parser.parse_args()
+
+    summary = SummaryCache(args.summary, source=args.file)
+    if args.rebuild:
+        summary.rebuild(args.file)
+    for macaddr, stats in sorted(summary.stats.devices.items()):
+        print("%s  %d shots" % (macaddr, stats["jab"].count))
+        for metric in ShotStats.metrics:
+            s = stats[metric]
+            low, high = s.band()
+            print("  %-13s mean %6.2f  std %5.2f  middle half %6.2f - %6.2f" % (
+                metric, s.mean, s.std(), low, high))
+
+
+if __name__ == '__main__':
+    main()
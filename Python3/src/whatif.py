@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+What-if re-scoring
+Re-applies any combination of config_options thresholds to stored shots
+and returns fault counts and pass rates per metric, e.g. "how many jab
+faults would I have had on High instead of Medium?".
+
+Each metric column is sorted once, after which the number of faults under
+any threshold is a single bisect, so a whole season evaluates in
+microseconds per configuration.
+"""
+
+import time
+import bisect
+import datetime
+import argparse
+from array import array
+from collections import Counter
+
+import digicueblue
+
+
+class WhatIf():
+
+    def __init__(self, dcb):
+        # dcb holds stored shots loaded with file_import()
+        self.dcb = dcb
+        self.shots = len(dcb.history)
+        self.columns = {}
+        for label, metric in dcb.config_metrics:
+            self.columns[metric] = array('d', sorted(dcb.history.column(metric)))
+
+        # faults flagged by the cue with the configuration used at the time
+        alerts = Counter(dcb.history.column("alert0"))
+        self.recorded_shots = self.shots - alerts.pop(-1, 0)
+        self.recorded = {}
+        for bit, (label, metric) in enumerate(dcb.config_metrics):
+            self.recorded[metric] = sum(n for alert0, n in alerts.items() if (alert0 >> bit) & 1)
+
+    def level(self, label, value):
+        # value is a config_options mode, its text, or -1 / "Off"
+        if value is None or value == -1 or value == "Off":
+            return None
+        for option, modes in self.dcb.config_options:
+            if option == label:
+                for text, mode in modes:
+                    if value == text or str(value) == str(mode):
+                        return mode
+        raise ValueError("Unknown setting %r for %s" % (value, label))
+
+    def faults(self, metric, threshold):
+        # a score below the threshold is a fault; scores are stored as
+        # float32, so compare against the float32 threshold
+        return bisect.bisect_left(self.columns[metric], array('f', [threshold])[0])
+
+    def evaluate(self, configuration):
+        """Return {label: result} for every metric enabled in configuration"""
+        results = {}
+        for label, metric in self.dcb.config_metrics:
+            level = self.level(label, configuration.get(label))
+            if level is None:
+                continue
+            threshold = self.dcb.threshold_levels[metric][level]
+            faults = self.faults(metric, threshold)
+            results[label] = {
+                "level": level,
+                "threshold": threshold,
+                "shots": self.shots,
+                "faults": faults,
+                "pass_rate": 1.0 - faults / float(self.shots) if self.shots else 0.0,
+                # over the shots stored with ALERT0 only, older rows lack it
+                "recorded_shots": self.recorded_shots,
+                "recorded_faults": self.recorded[metric],
+                "recorded_pass_rate": (1.0 - self.recorded[metric] / float(self.recorded_shots)
+                                       if self.recorded_shots else 0.0),
+            }
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Re-score stored shots under alternative thresholds')
+    parser.add_argument('-f', '--file', default='data.csv', help='shot store (default: data.csv)')
+    parser.add_argument('-m', '--mac', help='only shots from this MAC address')
+    parser.add_argument('--from', dest='datefrom', help='first date, YYYY-MM-DD')
+    parser.add_argument('--to', dest='dateto', help='last date, YYYY-MM-DD')
+    parser.add_argument('-s', '--set', action='append', default=[],
+                        help='setting to evaluate, e.g. -s Jab=High -s "Tip Steer=Medium"')
+    args = parser.parse_args()
+
+    datefrom = dateto = None
+    if args.datefrom:
+        datefrom = datetime.datetime.strptime(args.datefrom, "%Y-%m-%d")
+    if args.dateto:
+        dateto = datetime.datetime.strptime(args.dateto, "%Y-%m-%d") + datetime.timedelta(days=1)
+
+    configuration = {}
+    for item in args.set:
+        label, value = item.split('=', 1)
+        configuration[label.strip()] = value.strip()
+
+    dcb = digicueblue.DigicueBlue(filename=args.file)
+    dcb.file_import(datefrom, dateto, args.mac)
+    t0 = time.perf_counter()
+    engine = WhatIf(dcb)
+    t1 = time.perf_counter()
+    results = engine.evaluate(configuration)
+    t2 = time.perf_counter()
+
+    print("%-18s %-12s %9s %8s %8s %9s %9s %9s %9s" % (
+        "Metric", "Setting", "Threshold", "Shots", "Faults", "Pass", "Recorded", "Rec.Fault", "Rec.Pass"))
+    for label, result in results.items():
+        text = dict((mode, text) for option, modes in dcb.config_options if option == label for text, mode in modes)
+        print("%-18s %-12s %9.2f %8d %8d %8.1f%% %9d %9d %8.1f%%" % (
+            label, text[result["level"]], result["threshold"], result["shots"],
+            result["faults"], 100 * result["pass_rate"], result["recorded_shots"],
+            result["recorded_faults"], 100 * result["recorded_pass_rate"]))
+    print("Index %.1f ms, evaluate %.3f ms" % ((t1 - t0) * 1000, (t2 - t1) * 1000))
+
+
+if __name__ == '__main__':
+    main()